@@ -10,24 +10,39 @@
 	#include "main.h"
 	#include <string.h>
 
+	/* USER CODE BEGIN PD */
+	/* Protocol/timing profile, keep in sync with Emre/protocol.py */
+	#define PROTO_SIGNATURE_LEN  6
+	#define PROTO_RED_SIGNATURE  { 0x01, 0x02, 0x03, 0x04, 0x05, 0x06 }
+	#define PROTO_GREEN_SIGNATURE { 0x06, 0x05, 0x04, 0x03, 0x02, 0x01 }
+	#define PROTO_ACK            0xAC
+	#define PROTO_OVERRIDE_RED   0x00
+	#define PROTO_OVERRIDE_GREEN 0x01
+	#define RED_PHASE_MS         10000
+	#define GREEN_PHASE_MS       6000
+	#define RESEND_INTERVAL_MS   5
+	/* USER CODE END PD */
+
 	UART_HandleTypeDef huart2;
 	UART_HandleTypeDef huart3;
 
 	/* USER CODE BEGIN PV */
-	uint8_t redData[8];
-	uint8_t greenData[8];
+	static const uint8_t redSignature[PROTO_SIGNATURE_LEN] = PROTO_RED_SIGNATURE;
+	static const uint8_t greenSignature[PROTO_SIGNATURE_LEN] = PROTO_GREEN_SIGNATURE;
+	uint8_t redData[PROTO_SIGNATURE_LEN + 2];
+	uint8_t greenData[PROTO_SIGNATURE_LEN + 2];
 	uint8_t rxBuffer[8];
 	uint8_t ackBuf[1];
 
 
-	uint8_t ACK = 0xAC;
+	uint8_t ACK = PROTO_ACK;
 	uint8_t waiting_for_ack = 1;
 	uint8_t current_state = 1; // 1=RED, 2=RED_WAIT, 3=GREEN, 4=GREEN_WAIT
 
 	uint32_t last_send_time = 0;
 	uint32_t action_start_time = 0;
 
-	const uint32_t resend_interval = 5; // ms
+	const uint32_t resend_interval = RESEND_INTERVAL_MS; // ms
 	/* USER CODE END PV */
 
 	/* USER CODE BEGIN PFP */
@@ -47,17 +62,15 @@
 	  MX_USART2_UART_Init();
 	  MX_USART3_UART_Init();
 
-	  redData[0] = 0x01; redData[1] = 0x02; redData[2] = 0x03;
-	  redData[3] = 0x04; redData[4] = 0x05; redData[5] = 0x06;
-	  uint16_t crc_red = ModRTw_CRC(redData, 6);
-	  redData[6] = crc_red & 0xFF;
-	  redData[7] = (crc_red >> 8) & 0xFF;
+	  memcpy(redData, redSignature, PROTO_SIGNATURE_LEN);
+	  uint16_t crc_red = ModRTw_CRC(redData, PROTO_SIGNATURE_LEN);
+	  redData[PROTO_SIGNATURE_LEN] = crc_red & 0xFF;
+	  redData[PROTO_SIGNATURE_LEN + 1] = (crc_red >> 8) & 0xFF;
 
-	  greenData[0] = 0x06; greenData[1] = 0x05; greenData[2] = 0x04;
-	  greenData[3] = 0x03; greenData[4] = 0x02; greenData[5] = 0x01;
-	  uint16_t crc_green = ModRTw_CRC(greenData, 6);
-	  greenData[6] = crc_green & 0xFF;
-	  greenData[7] = (crc_green >> 8) & 0xFF;
+	  memcpy(greenData, greenSignature, PROTO_SIGNATURE_LEN);
+	  uint16_t crc_green = ModRTw_CRC(greenData, PROTO_SIGNATURE_LEN);
+	  greenData[PROTO_SIGNATURE_LEN] = crc_green & 0xFF;
+	  greenData[PROTO_SIGNATURE_LEN + 1] = (crc_green >> 8) & 0xFF;
 
 
 	  /* USER CODE END 1 */
@@ -79,7 +92,7 @@
 				}
 				else if (now - last_send_time >= resend_interval)
 				{
-					HAL_UART_Transmit(&huart2, redData, 8, 10);
+					HAL_UART_Transmit(&huart2, redData, sizeof(redData), 10);
 						HAL_UART_Receive_IT(&huart2, ackBuf, 1);
 
 
@@ -88,7 +101,7 @@
 				break;
 
 			case 2:
-				if (now - action_start_time >= 10000)
+				if (now - action_start_time >= RED_PHASE_MS)
 				{
 					HAL_GPIO_WritePin(GPIOD, GPIO_PIN_14, GPIO_PIN_RESET);
 					waiting_for_ack = 1;
@@ -106,14 +119,14 @@
 				}
 				else if (now - last_send_time >= resend_interval)
 				{
-					HAL_UART_Transmit(&huart2, greenData, 8, 10);
+					HAL_UART_Transmit(&huart2, greenData, sizeof(greenData), 10);
 					HAL_UART_Receive_IT(&huart2, ackBuf, 1);
 					last_send_time = now;
 				}
 				break;
 
 			case 4:
-				if (now - action_start_time >= 6000)
+				if (now - action_start_time >= GREEN_PHASE_MS)
 				{
 					HAL_GPIO_WritePin(GPIOD, GPIO_PIN_12, GPIO_PIN_RESET);
 					waiting_for_ack = 1;
@@ -153,20 +166,20 @@
 	}
 
 
-	if(ackBuf[0]==0x00){
+	if(ackBuf[0]==PROTO_OVERRIDE_RED){
 		HAL_GPIO_WritePin(GPIOD, GPIO_PIN_12, GPIO_PIN_RESET);
 		HAL_GPIO_WritePin(GPIOD, GPIO_PIN_14, GPIO_PIN_RESET);
 		waiting_for_ack=0;
 		current_state=1;
-		HAL_UART_Transmit_IT(&huart2, redData,8);
+		HAL_UART_Transmit_IT(&huart2, redData, sizeof(redData));
 	}
-	if(ackBuf[0]==0x01)
+	if(ackBuf[0]==PROTO_OVERRIDE_GREEN)
 	{
 		HAL_GPIO_WritePin(GPIOD, GPIO_PIN_12, GPIO_PIN_RESET);
 				HAL_GPIO_WritePin(GPIOD, GPIO_PIN_14, GPIO_PIN_RESET);
 		waiting_for_ack=0;
 		current_state=3;
-		HAL_UART_Transmit_IT(&huart2, greenData, 8);
+		HAL_UART_Transmit_IT(&huart2, greenData, sizeof(greenData));
 	}
 		}
 
@@ -0,0 +1,352 @@
+"""
+City-scale batch simulation of the traffic light protocol.
+
+Models hundreds or thousands of boards running the main.c state machine
+together with the host side (ACK every valid frame, drop no-op overrides) for
+capacity planning. Instead of one FirmwareEmulator object per board, board
+state lives in NumPy arrays and each vector step advances every board by one
+whole phase: the retransmissions of the phase frame, their loss, corruption
+and latency, and the ACK that ends them are drawn for all boards at once as a
+[boards x attempts] matrix. Boards are independent, so each keeps its own
+phase clock and the step count depends on the phase count, not on the number
+of boards.
+
+The bytes a host would have read from selected boards can be recorded and
+replayed through SerialComm as a spot check of the real decoder.
+
+Requires NumPy (pip install numpy).
+"""
+import argparse
+import time
+import serial
+from protocol import DEFAULT_PROFILE
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+RED, GREEN = 0, 1  # Phase codes in the state arrays
+NEVER = 2**62  # ACK arrival time of transmissions that get no ACK
+LATENCY_BINS = 2000  # ACK latency histogram: 1 ms bins, the last one collects the rest
+
+
+class CitySimulator:
+    """Vectorized model of many boards and their host links."""
+
+    def __init__(self, boards=500, profile=DEFAULT_PROFILE, loss=0.0, corruption=0.0,
+                 ack_loss=None, latency_ms=(1, 3), overrides_per_hour=0.0, record=(), seed=None):
+        """
+        Boot all boards at random offsets within one phase cycle.
+
+        Args:
+            boards: Number of intersections
+            profile: ProtocolProfile of the firmware build
+            loss: Probability that a frame towards the host is lost
+            corruption: Probability that a delivered frame arrives with a bad CRC
+            ack_loss: Probability that an ACK or override byte is lost, `loss` by default
+            latency_ms: (min, max) one-way latency in ms, drawn uniformly per message
+            overrides_per_hour: Mean override requests per board and hour
+            record: Board numbers whose host-side byte streams are kept
+            seed: Random seed for reproducible runs
+        """
+        if np is None:
+            raise ImportError("CitySimulator requires numpy: pip install numpy")
+        if not 0 <= loss < 1 or not 0 <= corruption < 1:
+            raise ValueError("loss and corruption must be in [0, 1)")
+        self.boards = boards
+        self.profile = profile
+        self.loss = loss
+        self.corruption = corruption
+        self.ack_loss = loss if ack_loss is None else ack_loss
+        if not 0 <= self.ack_loss < 1:
+            raise ValueError("ack_loss must be in [0, 1)")
+        self.latency_ms = latency_ms
+        self.overrides_per_hour = overrides_per_hour
+        self.rng = np.random.default_rng(seed)
+
+        self.resend_ms = profile.resend_ms
+        self.duration_ms = np.array([int(profile.red_seconds * 1000),
+                                     int(profile.green_seconds * 1000)])
+        self.frames = (profile.frame_by_light['RED'], profile.frame_by_light['GREEN'])
+        # Retransmissions drawn per step; enough to cover a round trip and a loss streak
+        self.attempts = max(16, 2 * (2 * latency_ms[1]) // self.resend_ms + 8)
+
+        # Per board: phase being sent and the time its first frame goes out (ms)
+        self.phase = np.full(boards, RED, dtype=np.int8)
+        self.phase_start = self.rng.integers(0, self.duration_ms.sum(), boards)
+        self.host_phase = np.full(boards, -1, dtype=np.int8)  # Last phase the host decoded
+
+        self.counters = dict.fromkeys((
+            'phases', 'frames_sent', 'retransmits', 'frames_lost', 'frames_corrupted',
+            'acks_sent', 'acks_lost', 'overrides_requested', 'overrides_noop', 'overrides_lost',
+            'overrides_applied', 'steps'
+        ), 0)
+        self.latency_histogram = np.zeros(LATENCY_BINS, dtype=np.int64)
+        self.streams = {board: [] for board in record}
+        self.now = 0  # Simulated time every board has reached, in ms
+
+    def _latency(self, shape):
+        low, high = self.latency_ms
+        return self.rng.integers(low, high + 1, shape)
+
+    def step(self, until=None):
+        """
+        Advance every board (or every board whose phase starts before `until`) by one phase.
+
+        Args:
+            until: Simulated time in ms; boards at or past it are left alone
+
+        Returns:
+            int: Number of boards advanced
+        """
+        boards = np.arange(self.boards) if until is None else np.flatnonzero(self.phase_start < until)
+        count = len(boards)
+        if not count:
+            return 0
+        self.counters['steps'] += 1
+        start = self.phase_start[boards]
+        phase = self.phase[boards]
+
+        # Every transmission the board would make until an ACK arrives; draw
+        # more attempts while some ACK lands after the last drawn transmission
+        sent_at, outcome, ack_at = self._attempts(count)
+        acked_at = ack_at.min(axis=1)
+        while (acked_at > sent_at[-1]).any():
+            more_sent, more_outcome, more_ack = self._attempts(count, len(sent_at))
+            sent_at = np.concatenate([sent_at, more_sent])
+            outcome = np.hstack([outcome, more_outcome])
+            ack_at = np.hstack([ack_at, more_ack])
+            acked_at = ack_at.min(axis=1)
+
+        # main.c handles a received ACK before its next transmission, so only
+        # the frames sent before the ACK arrived (and the one it answers) count
+        answered = ack_at.argmin(axis=1)
+        transmitted = np.maximum(-(-acked_at // self.resend_ms), answered + 1)
+        sent = np.arange(len(sent_at)) < transmitted[:, None]
+        self._count_attempts(outcome, sent, transmitted)
+        self.latency_histogram += np.bincount(np.minimum(acked_at, LATENCY_BINS - 1),
+                                              minlength=LATENCY_BINS)
+        self.counters['phases'] += count
+
+        # The host learns the phase from the first intact frame
+        decoded = ((outcome == 0) | (outcome == 3)) & sent
+        self.host_phase[boards[decoded.any(axis=1)]] = phase[decoded.any(axis=1)]
+
+        # Phase timer: from the ACK until the next phase, unless an override cuts in
+        timer_start = start + acked_at
+        next_start = timer_start + self.duration_ms[phase]
+        next_phase = 1 - phase
+        if self.overrides_per_hour:
+            next_start, next_phase = self._overrides(boards, phase, timer_start, next_start,
+                                                     next_phase)
+
+        if self.streams:
+            self._record(boards, start, phase, sent_at, outcome, sent)
+        self.phase_start[boards] = next_start
+        self.phase[boards] = next_phase
+        return count
+
+    def _attempts(self, count, offset=0):
+        """
+        Draw the outcome of consecutive transmissions for `count` boards.
+
+        Returns:
+            tuple: Send times relative to the phase start, outcome codes per
+            board and attempt (0 ACKed, 1 lost, 2 corrupted, 3 ACK lost) and
+            the ACK arrival times, NEVER where no ACK comes back
+        """
+        rng = self.rng
+        shape = (count, self.attempts)
+        sent_at = (offset + np.arange(self.attempts)) * self.resend_ms
+        draw = rng.random(shape)
+        outcome = np.where(draw < self.loss, 1, 0).astype(np.int8)
+        outcome[(outcome == 0) & (rng.random(shape) < self.corruption)] = 2
+        outcome[(outcome == 0) & (rng.random(shape) < self.ack_loss)] = 3
+        ack_at = np.where(outcome == 0, sent_at + self._latency(shape) + self._latency(shape), NEVER)
+        return sent_at, outcome, ack_at
+
+    def _count_attempts(self, outcome, sent, transmitted):
+        counters = self.counters
+        counters['frames_sent'] += int(transmitted.sum())
+        counters['retransmits'] += int((transmitted - 1).sum())
+        counters['frames_lost'] += int(((outcome == 1) & sent).sum())
+        counters['frames_corrupted'] += int(((outcome == 2) & sent).sum())
+        counters['acks_sent'] += int((((outcome == 0) | (outcome == 3)) & sent).sum())
+        counters['acks_lost'] += int(((outcome == 3) & sent).sum())
+
+    def _overrides(self, boards, phase, timer_start, next_start, next_phase):
+        """Operator overrides arriving while the phase timer runs."""
+        rng = self.rng
+        duration = next_start - timer_start
+        requested = rng.random(len(boards)) < -np.expm1(-duration * self.overrides_per_hour / 3.6e6)
+        self.counters['overrides_requested'] += int(requested.sum())
+
+        target = rng.integers(0, 2, len(boards)).astype(np.int8)
+        # The host drops requests for the phase it already shows
+        noop = requested & (target == self.host_phase[boards])
+        self.counters['overrides_noop'] += int(noop.sum())
+        lost = requested & ~noop & (rng.random(len(boards)) < self.ack_loss)
+        self.counters['overrides_lost'] += int(lost.sum())
+        applied = requested & ~noop & ~lost
+
+        # Arrival somewhere in the timer; the board sends the target frame once
+        # (without waiting for an ACK) and restarts the timer for that phase
+        arrival = timer_start + (rng.random(len(boards)) * duration).astype(np.int64)
+        arrival = np.minimum(arrival + self._latency(len(boards)), next_start - 1)
+        self.counters['overrides_applied'] += int(applied.sum())
+        self.counters['frames_sent'] += int(applied.sum())
+        self.host_phase[boards[applied]] = target[applied]
+        if self.streams:
+            for i in np.flatnonzero(applied):
+                if int(boards[i]) in self.streams:
+                    self.streams[int(boards[i])].append(
+                        (int(arrival[i]) + int(self._latency(1)[0]), self.frames[target[i]]))
+
+        next_start = np.where(applied, arrival + self.duration_ms[target], next_start)
+        next_phase = np.where(applied, 1 - target, next_phase).astype(np.int8)
+        return next_start, next_phase
+
+    def _record(self, boards, start, phase, sent_at, outcome, sent):
+        """Keep the delivered bytes of recorded boards, with their host arrival times."""
+        for i, board in enumerate(boards):
+            board = int(board)
+            if board not in self.streams:
+                continue
+            frame = self.frames[phase[i]]
+            for j in np.flatnonzero(sent[i] & (outcome[i] != 1)):
+                data = bytearray(frame)
+                if outcome[i, j] == 2:
+                    data[-1] ^= 0xFF
+                arrival = int(start[i] + sent_at[j] + self._latency(1)[0])
+                self.streams[board].append((arrival, bytes(data)))
+
+    def run(self, seconds):
+        """
+        Simulate every board for the given time.
+
+        Args:
+            seconds: Simulated seconds to add
+        """
+        self.now += int(seconds * 1000)
+        while self.step(until=self.now):
+            pass
+
+    def latency_percentile(self, fraction):
+        """Return the ACK latency in ms within which `fraction` of phases were acknowledged."""
+        total = self.latency_histogram.sum()
+        if not total:
+            return None
+        return int(np.searchsorted(np.cumsum(self.latency_histogram), fraction * total))
+
+    def stats(self):
+        """Return aggregate counters and ACK latency percentiles as a dictionary."""
+        result = dict(self.counters, boards=self.boards, simulated_seconds=self.now / 1000)
+        for name, fraction in (('ack_p50_ms', 0.5), ('ack_p99_ms', 0.99), ('ack_max_ms', 1.0)):
+            result[name] = self.latency_percentile(fraction)
+        return result
+
+    def byte_stream(self, board):
+        """
+        Return the bytes the host read from a recorded board, in arrival order.
+
+        Args:
+            board: A board number passed in `record`
+        """
+        return b''.join(frame for _, frame in sorted(self.streams[board], key=lambda e: e[0]))
+
+    def serial_factory(self, board):
+        """Return a serial.Serial-like factory replaying a recorded board's byte stream."""
+        data = self.byte_stream(board)
+        return lambda port=None, baudrate=115200, timeout=1: ReplaySerial(data, port)
+
+    def spot_check(self, board):
+        """
+        Feed a recorded board's byte stream through SerialComm.
+
+        Args:
+            board: A board number passed in `record`
+
+        Returns:
+            dict: Frames decoded per light, intact frames in the stream and ACKs written
+        """
+        from serial_comm import SerialComm
+
+        decoded = {}
+
+        def on_event(direction, light, data):
+            if direction == 'IN':
+                decoded[light] = decoded.get(light, 0) + 1
+
+        comm = SerialComm(on_event, port=f'BOARD{board}', serial_factory=self.serial_factory(board),
+                          profile=self.profile, start_thread=False)
+        while comm.ser.in_waiting:
+            comm.poll()
+        acks = comm.ser.written.count(self.profile.ack)
+        comm.close()
+        intact = sum(1 for _, frame in self.streams[board] if frame in self.profile.light_by_frame)
+        return {'decoded': decoded, 'intact': intact, 'acks': acks}
+
+
+class ReplaySerial:
+    """Minimal serial.Serial stand-in that returns a fixed byte stream."""
+
+    def __init__(self, data, port=None):
+        self.data = bytearray(data)
+        self.port = port
+        self.is_open = True
+        self.written = bytearray()
+
+    @property
+    def in_waiting(self):
+        if not self.is_open:
+            raise serial.PortNotOpenError()
+        return len(self.data)
+
+    def read(self, size=1):
+        chunk = bytes(self.data[:size])
+        del self.data[:size]
+        return chunk
+
+    def write(self, data):
+        self.written.extend(data)
+        return len(data)
+
+    def reset_input_buffer(self):
+        pass
+
+    def close(self):
+        self.is_open = False
+
+
+def main():
+    """Command-line capacity run."""
+    parser = argparse.ArgumentParser(description="Simulate many traffic light boards at once")
+    parser.add_argument('--boards', type=int, default=500)
+    parser.add_argument('--hours', type=float, default=1.0, help="Simulated hours")
+    parser.add_argument('--loss', type=float, default=0.01, help="Frame loss probability")
+    parser.add_argument('--corruption', type=float, default=0.001,
+                        help="Frame corruption probability")
+    parser.add_argument('--latency', type=int, nargs=2, default=(1, 3), metavar=('MIN', 'MAX'),
+                        help="One-way latency range in ms")
+    parser.add_argument('--overrides', type=float, default=2.0,
+                        help="Override requests per board and hour")
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    sim = CitySimulator(args.boards, loss=args.loss, corruption=args.corruption,
+                        latency_ms=tuple(args.latency), overrides_per_hour=args.overrides,
+                        record=(0,), seed=args.seed)
+    started = time.perf_counter()
+    sim.run(args.hours * 3600)
+    elapsed = time.perf_counter() - started
+    for name, value in sim.stats().items():
+        print(f"{name:>20}: {value}")
+    print(f"{args.boards} boards x {args.hours} h simulated in {elapsed:.2f} s")
+    check = sim.spot_check(0)
+    print(f"Board 0 spot check: SerialComm decoded {check['decoded']} of {check['intact']} "
+          f"intact frames and wrote {check['acks']} ACKs")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Phase countdown model for the traffic light simulator.
+"""
+import math
+import time
+
+
+class PhaseCountdown:
+    """Remaining time of the current phase, derived from the monotonic clock."""
+
+    def __init__(self, clock=time.monotonic):
+        """
+        Initialize an idle countdown.
+
+        Args:
+            clock: Function returning the current time in seconds
+        """
+        self.clock = clock
+        self.light = None
+        self.duration = 0
+        self.started_at = None
+
+    def start(self, light, duration, at=None):
+        """
+        Start a new phase.
+
+        Args:
+            light: Phase that started ('RED' or 'GREEN')
+            duration: Phase length in seconds
+            at: Monotonic time of the transition, now by default
+        """
+        self.light = light
+        self.duration = duration
+        self.started_at = self.clock() if at is None else at
+
+    def stop(self):
+        """Clear the countdown, e.g. when the link is lost."""
+        self.light = None
+        self.started_at = None
+
+    def is_running(self):
+        """Return True while a phase is being counted down."""
+        return self.started_at is not None
+
+    def remaining(self, now=None):
+        """
+        Seconds left in the current phase, never negative.
+
+        Args:
+            now: Monotonic time to evaluate at, now by default
+        """
+        if self.started_at is None:
+            return 0.0
+        now = self.clock() if now is None else now
+        return max(0.0, self.duration - (now - self.started_at))
+
+    def display(self, now=None):
+        """
+        Text to show for the countdown: whole seconds rounded up.
+
+        Args:
+            now: Monotonic time to evaluate at, now by default
+        """
+        if self.started_at is None:
+            return ""
+        return str(math.ceil(self.remaining(now)))
+
+    def until_next_change(self, now=None):
+        """
+        Seconds until display() returns a different value, or None if it never will.
+
+        Args:
+            now: Monotonic time to evaluate at, now by default
+        """
+        remaining = self.remaining(now)
+        if self.started_at is None or remaining <= 0:
+            return None
+        return remaining - (math.ceil(remaining) - 1)
@@ -0,0 +1,265 @@
+"""
+STM32 firmware emulator for the traffic light simulator.
+
+Models the state machine in Emirhan/Core/Src/main.c and exposes it through a
+pyserial-like port object, so the host side can be exercised without a board.
+"""
+import threading
+import time
+from collections import deque
+import serial
+from protocol import DEFAULT_PROFILE, ProtocolProfile
+
+# Firmware states: 1=RED, 2=RED_WAIT, 3=GREEN, 4=GREEN_WAIT
+STATE_RED, STATE_RED_WAIT, STATE_GREEN, STATE_GREEN_WAIT = 1, 2, 3, 4
+
+
+class FirmwareEmulator:
+    """Python model of the STM32 traffic light firmware."""
+
+    def __init__(self, profile=DEFAULT_PROFILE, clock=time.monotonic):
+        """
+        Initialize the emulated board.
+
+        Args:
+            profile: ProtocolProfile the firmware build was compiled with
+            clock: Function returning the current time in seconds
+        """
+        self.profile = profile
+        self.red_ms = int(profile.red_seconds * 1000)
+        self.green_ms = int(profile.green_seconds * 1000)
+        self.resend_ms = profile.resend_ms
+        self.red_frame = profile.frame_by_light['RED']
+        self.green_frame = profile.frame_by_light['GREEN']
+        self.clock = clock
+        self.lock = threading.Lock()
+
+        self.state = STATE_RED
+        self.waiting_for_ack = True
+        self.next_send = self._now_ms()
+        self.action_start = 0
+
+        # Bytes transmitted towards the host and not read yet
+        self.tx_buffer = bytearray()
+        self.link_down_until = 0.0
+        self.generation = 0
+
+        self.frames_sent = 0
+        self.frames_lost = 0
+        self.acks_received = 0
+        # Milliseconds from the first transmission of a phase frame to its ACK
+        self.ack_latencies = deque(maxlen=10000)
+        self.first_send = self.next_send
+
+    def __getstate__(self):
+        # Picklable so a board can be handed to a worker process
+        state = self.__dict__.copy()
+        del state['lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = threading.Lock()
+
+    def _now_ms(self):
+        # The epsilon keeps virtual clocks stepping in exact milliseconds
+        # from landing one tick early through float rounding
+        return int(self.clock() * 1000 + 1e-6)
+
+    def stats(self):
+        """Return transmission counters and ACK latencies as a dictionary."""
+        with self.lock:
+            return {
+                'frames_sent': self.frames_sent,
+                'frames_lost': self.frames_lost,
+                'acks_received': self.acks_received,
+                'ack_latencies': list(self.ack_latencies),
+            }
+
+    def link_up(self):
+        """Return True if the USB-serial link is currently usable."""
+        return self.clock() >= self.link_down_until
+
+    def disconnect(self, duration):
+        """
+        Simulate a USB-serial adapter reset.
+
+        Open port handles become invalid immediately and the port cannot be
+        reopened for the given duration. The board keeps running meanwhile.
+
+        Args:
+            duration: Seconds until the port can be opened again
+        """
+        with self.lock:
+            self.link_down_until = self.clock() + duration
+            self.generation += 1
+            self.tx_buffer.clear()
+
+    def _transmit(self, frame):
+        self.frames_sent += 1
+        if self.link_up():
+            self.tx_buffer.extend(frame)
+        else:
+            self.frames_lost += 1
+
+    def step(self):
+        """Run the firmware main loop up to the current time."""
+        with self.lock:
+            self._step(self._now_ms())
+
+    def _step(self, now):
+        while True:
+            if self.state in (STATE_RED, STATE_GREEN):
+                if not self.waiting_for_ack:
+                    self.state += 1
+                    self.action_start = now
+                    continue
+                if self.next_send > now:
+                    return
+                self._transmit(self.red_frame if self.state == STATE_RED else self.green_frame)
+                self.next_send += self.resend_ms
+            else:
+                duration = self.red_ms if self.state == STATE_RED_WAIT else self.green_ms
+                phase_end = self.action_start + duration
+                if phase_end > now:
+                    return
+                self.state = STATE_GREEN if self.state == STATE_RED_WAIT else STATE_RED
+                self.waiting_for_ack = True
+                self.next_send = phase_end
+                self.first_send = phase_end
+
+    def next_event(self):
+        """
+        Return the time in seconds of the board's next transmission or phase change.
+
+        Lets a virtual clock jump straight to the moment something happens
+        instead of stepping through every millisecond.
+        """
+        with self.lock:
+            if self.tx_buffer:
+                return self.clock()
+            if self.state in (STATE_RED, STATE_GREEN) and self.waiting_for_ack:
+                return self.next_send / 1000
+            duration = self.red_ms if self.state == STATE_RED_WAIT else self.green_ms
+            return (self.action_start + duration) / 1000
+
+    def receive(self, data):
+        """
+        Handle bytes written by the host (HAL_UART_RxCpltCallback).
+
+        Args:
+            data: Bytes received from the host
+        """
+        with self.lock:
+            now = self._now_ms()
+            self._step(now)
+            ack = self.profile.ack[0]
+            for byte in data:
+                override = self.profile.light_by_override.get(byte)
+                if byte == ack:
+                    self.acks_received += 1
+                    if self.waiting_for_ack and self.state in (STATE_RED, STATE_GREEN):
+                        self.ack_latencies.append(self.clock() * 1000 - self.first_send)
+                    self.waiting_for_ack = False
+                elif override is not None:
+                    self.waiting_for_ack = False
+                    self.state = STATE_RED if override == 'RED' else STATE_GREEN
+                    self._transmit(self.profile.frame_by_light[override])
+                self._step(now)
+
+    def serial_factory(self, port=None, baudrate=115200, timeout=1):
+        """Open a port on this board; signature matches serial.Serial."""
+        return EmulatedSerial(self, port=port, baudrate=baudrate, timeout=timeout)
+
+
+class EmulatedSerial:
+    """Minimal serial.Serial stand-in connected to a FirmwareEmulator."""
+
+    def __init__(self, emulator, port=None, baudrate=115200, timeout=1):
+        if not emulator.link_up():
+            raise serial.SerialException(f"could not open port {port}: device not present")
+        self.emulator = emulator
+        self.port = port
+        self.baudrate = baudrate
+        self.timeout = timeout
+        self.is_open = True
+        self.generation = emulator.generation
+
+    def _check(self):
+        if not self.is_open:
+            raise serial.PortNotOpenError()
+        if self.generation != self.emulator.generation:
+            raise serial.SerialException("device reports readiness to read but returned no data")
+
+    @property
+    def in_waiting(self):
+        self._check()
+        self.emulator.step()
+        return len(self.emulator.tx_buffer)
+
+    def read(self, size=1):
+        deadline = time.monotonic() + (self.timeout or 0)
+        while True:
+            available = self.in_waiting
+            if available >= size or time.monotonic() >= deadline:
+                break
+            time.sleep(0.001)
+        with self.emulator.lock:
+            data = bytes(self.emulator.tx_buffer[:size])
+            del self.emulator.tx_buffer[:size]
+        return data
+
+    def write(self, data):
+        self._check()
+        self.emulator.receive(bytes(data))
+        return len(data)
+
+    def reset_input_buffer(self):
+        self._check()
+        with self.emulator.lock:
+            self.emulator.tx_buffer.clear()
+
+    def close(self):
+        self.is_open = False
+
+
+def measure_recovery(outage=0.5, cycles=3):
+    """
+    Measure how quickly SerialComm recovers from simulated adapter resets.
+
+    Args:
+        outage: Seconds the emulated port stays unavailable
+        cycles: Number of resets to inject
+
+    Returns:
+        list: Seconds from each fault until the link reported CONNECTED
+    """
+    from serial_comm import SerialComm
+
+    emulator = FirmwareEmulator(ProtocolProfile(red_seconds=0.3, green_seconds=0.2))
+    connected = threading.Event()
+
+    def on_event(direction, light, data):
+        if direction == 'LINK' and light == 'CONNECTED':
+            connected.set()
+
+    comm = SerialComm(on_event, port='EMU', serial_factory=emulator.serial_factory,
+                      profile=emulator.profile)
+    results = []
+    try:
+        for _ in range(cycles):
+            time.sleep(0.5)
+            connected.clear()
+            fault_time = time.monotonic()
+            emulator.disconnect(outage)
+            if connected.wait(outage + 10):
+                results.append(time.monotonic() - fault_time)
+    finally:
+        comm.close()
+    return results
+
+
+if __name__ == "__main__":
+    recoveries = measure_recovery()
+    for i, seconds in enumerate(recoveries, 1):
+        print(f"Reset {i}: link restored after {seconds:.3f} s")
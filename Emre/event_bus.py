@@ -0,0 +1,177 @@
+"""
+Publish/subscribe event bus for the traffic light simulator.
+
+Every subscriber owns a bounded queue and a delivery thread, so publishing
+never waits for a consumer: the serial reader keeps decoding and ACKing even
+if a journal, dashboard or network bridge falls behind.
+"""
+import queue
+import threading
+import time
+from collections import namedtuple
+
+TOPIC_RAW_FRAME = 'raw_frame'        # Every packet in or out
+TOPIC_PHASE_CHANGE = 'phase_change'  # The light changed to RED or GREEN
+TOPIC_ACK = 'ack'                    # ACK sent to the device
+TOPIC_OVERRIDE = 'override'          # Manual override sent to the device
+TOPIC_LINK = 'link'                  # Serial link CONNECTED/DISCONNECTED
+TOPIC_ERROR = 'error'                # Link lost or unrecognised frame
+
+TOPICS = (TOPIC_RAW_FRAME, TOPIC_PHASE_CHANGE, TOPIC_ACK, TOPIC_OVERRIDE, TOPIC_LINK, TOPIC_ERROR)
+
+Event = namedtuple('Event', ['topic', 'direction', 'light', 'data', 'timestamp'])
+
+_STOP = object()
+
+
+class Subscription:
+    """A subscriber's bounded queue and the thread delivering from it."""
+
+    def __init__(self, handler, topics=None, maxsize=1000, name=None, synchronous=False):
+        """
+        Start delivering events to a handler.
+
+        Args:
+            handler: Function called with each Event on the delivery thread
+            topics: Topics to receive, all topics if None
+            maxsize: Queue bound; when full the oldest event is dropped
+            name: Name of the delivery thread
+            synchronous: Call the handler directly from publish() instead,
+                without a queue or thread
+        """
+        self.handler = handler
+        self.topics = frozenset(topics) if topics is not None else None
+        self.synchronous = synchronous
+        self.queue = queue.Queue(maxsize)
+        self.dropped = 0
+        self.errors = 0
+        self.thread = None
+        if not synchronous:
+            self.thread = threading.Thread(target=self._run, name=name, daemon=True)
+            self.thread.start()
+
+    def wants(self, topic):
+        """Return True if this subscription receives the given topic."""
+        return self.topics is None or topic in self.topics
+
+    def deliver(self, event):
+        """
+        Queue an event without blocking, dropping the oldest one if full.
+
+        Args:
+            event: Event or the internal stop marker
+        """
+        if self.synchronous:
+            if event is not _STOP:
+                self._handle(event)
+            return
+        while True:
+            try:
+                self.queue.put_nowait(event)
+                return
+            except queue.Full:
+                try:
+                    self.queue.get_nowait()
+                    self.dropped += 1
+                except queue.Empty:
+                    pass
+
+    def _run(self):
+        while True:
+            event = self.queue.get()
+            if event is _STOP:
+                break
+            self._handle(event)
+
+    def _handle(self, event):
+        try:
+            self.handler(event)
+        except Exception:
+            # A failing consumer must not take the others down with it
+            self.errors += 1
+
+    def close(self, timeout=1.0):
+        """
+        Stop the delivery thread after the events already queued.
+
+        Args:
+            timeout: Seconds to wait for the thread to finish
+        """
+        self.deliver(_STOP)
+        if self.thread and threading.current_thread() is not self.thread:
+            self.thread.join(timeout)
+
+
+class EventBus:
+    """Fan-out of controller events to any number of subscribers."""
+
+    def __init__(self, synchronous=False, clock=time.monotonic):
+        """
+        Initialize an empty bus.
+
+        Args:
+            synchronous: Deliver every event on the publishing thread; used by
+                deterministic tests, not by the GUI
+            clock: Function timestamping events that carry no timestamp
+        """
+        self.synchronous = synchronous
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.subscriptions = []
+
+    def subscribe(self, handler, topics=None, maxsize=1000, name=None):
+        """
+        Register a handler.
+
+        Args:
+            handler: Function called with each Event on its own thread
+            topics: Topics to receive, all topics if None
+            maxsize: Queue bound for this subscriber
+            name: Name of the delivery thread
+
+        Returns:
+            Subscription: Handle for unsubscribe() and drop/error counters
+        """
+        for topic in topics or ():
+            if topic not in TOPICS:
+                raise ValueError(f"Unknown topic: {topic}")
+        subscription = Subscription(handler, topics, maxsize, name, self.synchronous)
+        with self.lock:
+            self.subscriptions = self.subscriptions + [subscription]
+        return subscription
+
+    def unsubscribe(self, subscription):
+        """
+        Remove a handler and stop its delivery thread.
+
+        Args:
+            subscription: Handle returned by subscribe()
+        """
+        with self.lock:
+            self.subscriptions = [s for s in self.subscriptions if s is not subscription]
+        subscription.close()
+
+    def publish(self, topic, direction, light, data, timestamp=None):
+        """
+        Queue an event for every interested subscriber; never blocks.
+
+        Args:
+            topic: One of TOPICS
+            direction: 'IN', 'OUT' or 'LINK'
+            light: Light state or link state
+            data: Raw packet data
+            timestamp: Monotonic time of the event, now by default
+        """
+        event = Event(topic, direction, light, data,
+                      self.clock() if timestamp is None else timestamp)
+        # The list is replaced, never mutated, so it can be iterated without the lock
+        for subscription in self.subscriptions:
+            if subscription.wants(topic):
+                subscription.deliver(event)
+
+    def close(self):
+        """Stop all delivery threads."""
+        with self.lock:
+            subscriptions, self.subscriptions = self.subscriptions, []
+        for subscription in subscriptions:
+            subscription.close()
@@ -0,0 +1,272 @@
+"""
+Packet log export for the traffic light simulator.
+
+Streams a journal to CSV or to a columnar format: Parquet or Arrow IPC when
+pyarrow is installed, otherwise a directory of NumPy .npy files, one per
+column, which np.load() can memory-map. The .npy files are written without
+NumPy. Records are processed one block at a time, so memory stays constant
+however long the journal is.
+"""
+import argparse
+import json
+import os
+import shutil
+import struct
+import time
+from array import array
+from datetime import datetime
+from protocol import DIRECTIONS, LIGHTS, MAX_DATA
+from journal import JournalReader, parse_time
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+FORMATS = ('csv', 'parquet', 'arrow', 'npy')
+CSV_HEADER = 'timestamp,time,direction,light,data\n'
+
+# Column name, .npy dtype
+NPY_COLUMNS = (
+    ('timestamp', '<f8'),
+    ('direction', '|u1'),
+    ('light', '|u1'),
+    ('length', '|u1'),
+    ('data', f'|S{MAX_DATA}'),
+)
+NPY_HEADER_SIZE = 128  # Fixed, so the row count can be filled in at the end
+
+
+def columnar_format():
+    """Return the best columnar format available: 'parquet' with pyarrow, else 'npy'."""
+    return 'parquet' if pa is not None else 'npy'
+
+
+def format_for(path):
+    """
+    Pick an export format from the output file name.
+
+    Args:
+        path: Output path
+
+    Returns:
+        str: One of FORMATS; names without a known suffix get the columnar default
+    """
+    suffix = os.path.splitext(path)[1].lower()
+    return {'.csv': 'csv', '.parquet': 'parquet', '.arrow': 'arrow', '.feather': 'arrow',
+            '.npy': 'npy'}.get(suffix, columnar_format())
+
+
+class _CsvWriter:
+    """CSV output with per-block caches for the expensive formatting."""
+
+    def __init__(self, path):
+        self.file = open(path, 'w', encoding='utf-8', newline='')
+        self.file.write(CSV_HEADER)
+        self.seconds = {}
+        self.tails = {}
+
+    def write(self, rows):
+        times, directions, lights, lengths, datas = zip(*rows)
+        millis = [int(t * 1000 + 0.5) for t in times]
+
+        # strftime once per distinct second instead of once per packet
+        seconds = self.seconds
+        for second in {ms // 1000 for ms in millis}:
+            if second not in seconds:
+                seconds[second] = datetime.fromtimestamp(second).strftime('%Y-%m-%d %H:%M:%S')
+        # Packets repeat a handful of frames; format each distinct one once
+        tails = self.tails
+        keys = list(zip(directions, lights, lengths, datas))
+        for key in set(keys):
+            if key not in tails:
+                direction, light, length, data = key
+                tails[key] = f",{DIRECTIONS[direction]},{LIGHTS[light]},{data[:length].hex(' ').upper()}\n"
+
+        self.file.write(''.join([
+            f'{t:.6f},{seconds[ms // 1000]}.{ms % 1000:03d}{tails[key]}'
+            for t, ms, key in zip(times, millis, keys)
+        ]))
+        # Keep the caches bounded on long or noisy journals
+        if len(seconds) > 100000:
+            seconds.clear()
+        if len(tails) > 10000:
+            tails.clear()
+
+    def close(self):
+        self.file.close()
+
+
+class _NpyWriter:
+    """One .npy file per column, appended block by block."""
+
+    def __init__(self, path):
+        os.makedirs(path, exist_ok=True)
+        self.count = 0
+        self.files = {}
+        for name, descr in NPY_COLUMNS:
+            f = open(os.path.join(path, name + '.npy'), 'wb')
+            f.write(self._header(descr, 0))
+            self.files[name] = (f, descr)
+        # Codes in the direction/light columns index these names
+        with open(os.path.join(path, 'labels.json'), 'w', encoding='utf-8') as f:
+            json.dump({'direction': DIRECTIONS, 'light': LIGHTS}, f)
+
+    @staticmethod
+    def _header(descr, count):
+        text = repr({'descr': descr, 'fortran_order': False, 'shape': (count,)})
+        text = text.ljust(NPY_HEADER_SIZE - 10 - 1) + '\n'
+        return b'\x93NUMPY\x01\x00' + struct.pack('<H', len(text)) + text.encode('latin1')
+
+    def write(self, rows):
+        times, directions, lights, lengths, datas = zip(*rows)
+        self.files['timestamp'][0].write(array('d', times).tobytes())
+        self.files['direction'][0].write(bytes(directions))
+        self.files['light'][0].write(bytes(lights))
+        self.files['length'][0].write(bytes(lengths))
+        self.files['data'][0].write(b''.join(datas))
+        self.count += len(rows)
+
+    def close(self):
+        for f, descr in self.files.values():
+            f.seek(0)
+            f.write(self._header(descr, self.count))
+            f.close()
+
+
+class _ArrowWriter:
+    """Parquet or Arrow IPC output through pyarrow."""
+
+    def __init__(self, path, fmt):
+        self.schema = pa.schema([
+            ('time', pa.timestamp('us')),
+            ('direction', pa.dictionary(pa.int8(), pa.string())),
+            ('light', pa.dictionary(pa.int8(), pa.string())),
+            ('data', pa.binary()),
+        ])
+        self.directions = pa.array(DIRECTIONS, pa.string())
+        self.lights = pa.array(LIGHTS, pa.string())
+        if fmt == 'parquet':
+            self.writer = pq.ParquetWriter(path, self.schema)
+        else:
+            self.writer = pa.ipc.new_file(path, self.schema)
+
+    def _codes(self, values, dictionary):
+        indices = pa.Array.from_buffers(pa.int8(), len(values), [None, pa.py_buffer(bytes(values))])
+        return pa.DictionaryArray.from_arrays(indices, dictionary)
+
+    def write(self, rows):
+        times, directions, lights, lengths, datas = zip(*rows)
+        micros = pc.cast(pc.round(pc.multiply(pa.array(times, pa.float64()), 1e6)), pa.int64())
+        batch = pa.record_batch([
+            micros.cast(pa.timestamp('us')),
+            self._codes(directions, self.directions),
+            self._codes(lights, self.lights),
+            pa.array([data[:n] for data, n in zip(datas, lengths)], pa.binary()),
+        ], schema=self.schema)
+        self.writer.write_batch(batch)
+
+    def close(self):
+        self.writer.close()
+
+
+def _publish(partial, output):
+    # Move a finished export into place; .npy directories file by file
+    if os.path.isdir(partial):
+        os.makedirs(output, exist_ok=True)
+        for name in os.listdir(partial):
+            os.replace(os.path.join(partial, name), os.path.join(output, name))
+        os.rmdir(partial)
+    else:
+        os.replace(partial, output)
+
+
+def _discard(partial):
+    if os.path.isdir(partial):
+        shutil.rmtree(partial, ignore_errors=True)
+    elif os.path.exists(partial):
+        os.remove(partial)
+
+
+def export(journal_path, output, fmt=None, start=None, end=None, chunk_size=65536,
+           progress=None, cancel=None):
+    """
+    Stream the records of a journal to a file.
+
+    The output is written under output + '.part' and only renamed into place
+    once complete, so a failed or cancelled export never leaves a truncated
+    file that looks valid.
+
+    Args:
+        journal_path: Journal to read
+        output: Output file, or directory for 'npy'
+        fmt: One of FORMATS, chosen from the output name if None
+        start: Wall-clock start time, unbounded if None
+        end: Wall-clock end time, unbounded if None
+        chunk_size: Records processed per block
+        progress: Optional function called with (records written, records in range)
+        cancel: Optional threading.Event; when set the export stops after the
+            current block and nothing is written to output
+
+    Returns:
+        int: Number of records processed
+    """
+    fmt = fmt or format_for(output)
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown export format: {fmt}")
+    if fmt in ('parquet', 'arrow') and pa is None:
+        raise ValueError(f"Exporting to {fmt} requires pyarrow; use 'csv' or 'npy'")
+
+    partial = output + '.part'
+    reader = writer = None
+    written = 0
+    try:
+        reader = JournalReader(journal_path)
+        if fmt == 'csv':
+            writer = _CsvWriter(partial)
+        elif fmt == 'npy':
+            writer = _NpyWriter(partial)
+        else:
+            writer = _ArrowWriter(partial, fmt)
+        first, last = reader.record_range(start, end)
+        for rows in reader.chunks(start, end, chunk_size):
+            writer.write(rows)
+            written += len(rows)
+            if progress:
+                progress(written, last - first)
+            if cancel is not None and cancel.is_set():
+                break
+        done, writer = writer, None  # Closed here, so not again below
+        done.close()
+        if cancel is None or not cancel.is_set():
+            _publish(partial, output)
+    finally:
+        if writer is not None:
+            writer.close()
+        if reader is not None:
+            reader.close()
+        _discard(partial)
+    return written
+
+
+def main():
+    """Command-line export tool."""
+    parser = argparse.ArgumentParser(description="Export a traffic light packet journal")
+    parser.add_argument('journal', help="Journal file")
+    parser.add_argument('output', help="Output file (.csv, .parquet, .arrow) or .npy directory")
+    parser.add_argument('--format', choices=FORMATS,
+                        help=f"Output format (default: from the output name, else {columnar_format()})")
+    parser.add_argument('--start', type=parse_time, help="ISO start time, e.g. 2024-05-01T02:00")
+    parser.add_argument('--end', type=parse_time, help="ISO end time")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    count = export(args.journal, args.output, args.format, args.start, args.end)
+    elapsed = time.perf_counter() - started
+    print(f"{count} records exported to {args.output} in {elapsed:.1f} s")
+
+
+if __name__ == "__main__":
+    main()
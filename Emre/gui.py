@@ -2,35 +2,62 @@
 GUI module for the traffic light simulator.
 """
 import tkinter as tk
-from tkinter import ttk, scrolledtext, messagebox
+from tkinter import ttk, scrolledtext, messagebox, filedialog
+import queue
+import threading
 import time
+from collections import deque
 from serial.tools import list_ports
 from traffic_controller import TrafficLightController
+from protocol import DEFAULT_PROFILE
+from countdown import PhaseCountdown
+from state_server import StateServer
+from journal import JournalWriter
+from timeline import PhaseStore, TimelineView
+import export
 
 
 class TrafficLightGUI:
     """Main GUI application for the traffic light simulator."""
     
-    def __init__(self, root, baudrate=115200):
+    def __init__(self, root, baudrate=None, profile=DEFAULT_PROFILE, isolated=False,
+                 server_port=None, journal_path=None, scheduler=None, clock=time.monotonic):
         """
         Initialize the GUI application.
         
         Args:
             root: Tkinter root window
-            baudrate: Serial communication baud rate
+            baudrate: Serial communication baud rate, the profile's by default
+            profile: ProtocolProfile used for decoding and phase timing
+            isolated: Run the serial I/O in a separate process
+            server_port: TCP port for sharing state with other dashboards, or None
+            journal_path: File to record every packet to, or None
+            scheduler: Object providing after()/after_cancel(), the root by default;
+                a virtual_clock.VirtualClock makes the timing logic deterministic
+            clock: Monotonic clock for the phase countdown
         """
         self.root = root
+        self.scheduler = scheduler or root
         self.root.title("STM32 Traffic Light Simulator")
         self.controller = None
-        self.baudrate = baudrate
+        self.profile = profile
+        self.baudrate = baudrate or profile.baudrate
+        self.isolated = isolated
+        self.server_port = server_port
+        self.server = None
+        self.journal_path = journal_path
+        self.journal = None
         self.com_port = None
         self.connected = False
         
         # Initialize GUI state variables
         self.current_state = 'RED'
-        self.log_entries = []
-        self.timer_id = None
-        self.timer_remaining = 0
+        self.log_entries = deque(maxlen=100)  # Only the last 100 are shown
+        self.after_ids = {}  # One pending callback per periodic task
+        self.events = queue.Queue(maxsize=1000)  # Controller events waiting for the Tk thread
+        self.timer_text = ""
+        self.countdown = PhaseCountdown(clock)
+        self.override_pending = False
         self.previous_light = None
         self._last_ports = []
         
@@ -38,17 +65,33 @@ class TrafficLightGUI:
         self.lights = {'Main': {}, 'Side': {}}
         self.car_canvases = {'Main': None, 'Side': None}
         self.car_positions = {'Main': 0, 'Side': 0}
+        self.phase_store = PhaseStore()
+        self.export_thread = None
+        self.export_progress = None
+        self.export_error = None
+        self.export_cancel = threading.Event()
         
         # Setup the user interface
         self.setup_ui()
         self.refresh_ports()  # Start periodic port refresh
+        self.refresh_timeline()
 
     def setup_ui(self):
         """Setup the user interface components."""
+        self._setup_menu()
         self._setup_port_selection()
         self._setup_main_interface()
+        self._setup_timeline_interface()
         self._setup_log_interface()
 
+    def _setup_menu(self):
+        """Setup the menu bar."""
+        menubar = tk.Menu(self.root)
+        file_menu = tk.Menu(menubar, tearoff=0)
+        file_menu.add_command(label="Export journal...", command=self.export_journal)
+        menubar.add_cascade(label="File", menu=file_menu)
+        self.root.config(menu=menubar)
+
     def _setup_port_selection(self):
         """Setup the COM port selection interface."""
         port_frame = tk.Frame(self.root)
@@ -71,6 +114,9 @@ class TrafficLightGUI:
         
         self.connect_btn = tk.Button(port_frame, text="Connect", command=self.connect_port)
         self.connect_btn.pack(side='left', padx=5)
+        
+        self.link_label = tk.Label(port_frame, text="Not connected", fg="gray")
+        self.link_label.pack(side='left', padx=5)
 
     def _setup_main_interface(self):
         """Setup the main traffic light and car animation interface."""
@@ -119,6 +165,19 @@ class TrafficLightGUI:
         self.timer_label = tk.Label(main_frame, text="", font=("Arial", 14, "bold"), fg="blue")
         self.timer_label.grid(row=2, column=0, pady=10)
 
+    def _setup_timeline_interface(self):
+        """Setup the phase history timeline."""
+        timeline_frame = tk.Frame(self.root)
+        timeline_frame.pack(pady=5)
+        
+        tk.Label(timeline_frame, text="History:").pack(side='left')
+        self.timeline = TimelineView(timeline_frame, self.phase_store, width=560)
+        self.timeline.pack(side='left', padx=5)
+        tk.Label(
+            timeline_frame, text="wheel: zoom\ndrag: pan\ndouble-click: live",
+            font=("Arial", 8), justify='left'
+        ).pack(side='left')
+
     def _setup_log_interface(self):
         """Setup the log display interface."""
         log_frame = tk.Frame(self.root)
@@ -127,6 +186,9 @@ class TrafficLightGUI:
         tk.Label(log_frame, text="Log:").pack(side='left')
         self.log_box = scrolledtext.ScrolledText(log_frame, width=80, height=16, state='disabled')
         self.log_box.pack(pady=5)
+        
+        self.export_label = tk.Label(self.root, text="", fg="gray")
+        self.export_label.pack()
 
     def refresh_ports(self):
         """Periodically refresh the list of available COM ports."""
@@ -141,7 +203,7 @@ class TrafficLightGUI:
                     self.selected_port.set(port_list[0] if port_list else "")
                 self._last_ports = port_list
             
-            self.root.after(1000, self.refresh_ports)
+            self._after('ports', 1000, self.refresh_ports)
 
     def connect_port(self):
         """Connect to the selected COM port."""
@@ -151,12 +213,36 @@ class TrafficLightGUI:
             return
         
         self.com_port = port
-        self.controller = TrafficLightController(self.log_event, port=port, baudrate=self.baudrate)
+        self.attach_controller(TrafficLightController(
+            self.queue_event, port=port, baudrate=self.baudrate, profile=self.profile,
+            isolated=self.isolated
+        ))
+
+    def attach_controller(self, controller):
+        """
+        Start showing a controller's events; connect_port() uses this for real ports.
+        
+        Args:
+            controller: TrafficLightController created with queue_event as its callback;
+                an unthreaded controller polled from the Tk thread may use log_event
+        """
+        self.controller = controller
+        if self.server_port is not None:
+            try:
+                self.server = StateServer(self.controller, port=self.server_port).start()
+            except (OSError, RuntimeError) as e:
+                # The local display still works without sharing
+                messagebox.showerror("State Server",
+                                     f"Could not serve on port {self.server_port}: {e}")
+        if self.journal_path:
+            self.journal = JournalWriter(self.journal_path).attach(self.controller)
         self.update_lights('RED', None)
+        self.process_events()
         self.animate_cars('Main')
         self.animate_cars('Side')
         self.connect_btn.config(state='disabled')
         self.port_combo.config(state='disabled')
+        self.link_label.config(text="Connected", fg="green")
         self.connected = True
 
     def draw_cars(self, road, stopped):
@@ -194,7 +280,7 @@ class TrafficLightGUI:
         else:
             self.draw_cars(road, stopped=True)
         
-        self.root.after(150, lambda: self.animate_cars(road))
+        self._after(f'cars-{road}', 150, lambda: self.animate_cars(road))
 
     def update_lights(self, active_light, data):
         """
@@ -208,20 +294,57 @@ class TrafficLightGUI:
         for road in ['Main', 'Side']:
             for light, info in self.lights[road].items():
                 color = {'RED': 'red', 'GREEN': 'green'}[light]
-                if road == 'Main':
+                if active_light not in ('RED', 'GREEN'):
+                    fill = 'gray'  # State unknown, e.g. link lost
+                elif road == 'Main':
                     fill = color if light == active_light else 'gray'
                 else:  # Side road
                     fill = color if light != active_light else 'gray'
                 info['canvas'].itemconfig(info['oval'], fill=fill)
 
-    def log_event(self, direction, light, data):
+    def queue_event(self, direction, light, data):
+        """
+        Controller callback; queues an event for process_events().
+        
+        Runs on the bus delivery thread, so it must not touch Tk or after_ids.
+        The arrival time is taken here so the countdown does not lag by the
+        drain interval.
+        
+        Args:
+            direction: 'IN', 'OUT' or 'LINK'
+            light: Light state
+            data: Raw packet data
+        """
+        item = (direction, light, data, self.countdown.clock())
+        try:
+            self.events.put_nowait(item)
+        except queue.Full:
+            # The Tk thread is stalled; like the bus, drop the oldest event
+            try:
+                self.events.get_nowait()
+            except queue.Empty:
+                pass
+            self.events.put_nowait(item)
+
+    def process_events(self):
+        """Apply queued controller events on the Tk thread, then check again shortly."""
+        while True:
+            try:
+                direction, light, data, received_at = self.events.get_nowait()
+            except queue.Empty:
+                break
+            self.log_event(direction, light, data, received_at)
+        self._after('events', 50, self.process_events)
+
+    def log_event(self, direction, light, data, at=None):
         """
-        Log an event and update the GUI accordingly.
+        Log an event and update the GUI accordingly; call on the Tk thread only.
         
         Args:
             direction: 'IN' or 'OUT'
             light: Light state
             data: Raw packet data
+            at: Monotonic time the event arrived, now by default
         """
         entry = {
             'direction': direction,
@@ -232,54 +355,110 @@ class TrafficLightGUI:
         self.log_entries.append(entry)
         self.update_log_box()
         
-        if direction == 'IN':
+        if direction == 'LINK':
+            self.show_link_state(light)
+        elif direction == 'OUT' and light in self.profile.override_by_light:
+            # Only overrides that actually went out restart the countdown;
+            # coalesced and no-op clicks never reach this point
+            self.override_pending = True
+            self.phase_store.record_override()
+        elif direction == 'IN':
+            received_at = self.countdown.clock() if at is None else at
             self.current_state = light
             self.update_lights(light, data)
-            self.reset_timer_on_signal(light)
+            self.phase_store.record_phase(light if light in self.profile.phase_seconds else None)
+            # Retransmitted frames repeat the current phase; only a real
+            # transition (or an override we asked for) restarts the countdown
+            if light != self.previous_light or self.override_pending or not self.countdown.is_running():
+                self.reset_timer_on_signal(light, received_at)
+                self.override_pending = False
             self.reset_car_positions_on_signal()
             self.previous_light = light
 
-    def reset_timer_on_signal(self, light):
+    def show_link_state(self, state):
+        """
+        Reflect the serial link state so a lost device never shows a stale light.
+        
+        Args:
+            state: 'CONNECTED' or 'DISCONNECTED'
+        """
+        if state == 'CONNECTED':
+            downtime = self.controller.serial.last_downtime if self.controller else 0.0
+            self.link_label.config(text=f"Connected (recovered after {downtime:.1f} s)", fg="green")
+        else:
+            self.link_label.config(text="Disconnected - reconnecting...", fg="red")
+            self.current_state = 'UNKNOWN'
+            self.update_lights(None, None)
+            self.reset_timer_on_signal(None)
+            self.previous_light = None
+            self.phase_store.record_phase(None)
+
+    def reset_timer_on_signal(self, light, at=None):
         """
         Reset and start the timer based on the current light.
         
         Args:
             light: Current light state
+            at: Monotonic time of the phase transition, now by default
         """
-        # Always reset timer to 15 on every signal (if RED or GREEN)
-        if self.timer_id:
-            self.root.after_cancel(self.timer_id)
-            self.timer_id = None
-        self.timer_label.config(text="")
-        
-        if light == 'RED':
-            self.timer_remaining = 10
-            self.update_timer_label(light)
-        elif light == 'GREEN':
-            self.timer_remaining = 6
-            self.update_timer_label(light)
+        self._cancel('timer')
+        
+        if light in self.profile.phase_seconds:
+            self.countdown.start(light, self.profile.phase_seconds[light], at)
         else:
-            self.timer_remaining = 0
-            self.timer_label.config(text="")
+            self.countdown.stop()
+        self.update_timer_label()
 
     def reset_car_positions_on_signal(self):
         """Reset car positions so speed does not increase with every signal."""
         self.car_positions = {'Main': 0, 'Side': 0}
 
-    def update_timer_label(self, light):
+    def update_timer_label(self):
         """
         Update the timer display.
         
-        Args:
-            light: Current light state
+        The remaining time is derived from the clock at render time, so a busy
+        main loop delays a redraw but never skews the countdown. The label is
+        only reconfigured when the displayed second changes, and the next
+        redraw is scheduled for exactly that moment.
         """
-        if self.timer_remaining > 0:
-            self.timer_label.config(text=f"{self.timer_remaining}")
-            self.timer_remaining -= 1
-            self.timer_id = self.root.after(1000, lambda: self.update_timer_label(light))
+        now = self.countdown.clock()
+        text = self.countdown.display(now)
+        if text != self.timer_text:
+            self.timer_label.config(text=text)
+            self.timer_text = text
+        
+        delay = self.countdown.until_next_change(now)
+        if delay is None:
+            self.after_ids.pop('timer', None)
         else:
-            self.timer_label.config(text="0")
-            self.timer_id = None
+            self._after('timer', int(delay * 1000) + 1, self.update_timer_label)
+
+    def _after(self, name, ms, func):
+        """
+        Schedule a periodic task's next run, replacing any run already pending.
+        
+        Keeping one id per task means restarting a task (e.g. reconnecting)
+        never leaves a second chain running, and on_close() can cancel them all.
+        
+        Args:
+            name: Task name
+            ms: Delay in milliseconds
+            func: Function to call
+        """
+        self._cancel(name)
+        self.after_ids[name] = self.scheduler.after(ms, func)
+
+    def _cancel(self, name):
+        """Cancel a periodic task's pending run, if any."""
+        after_id = self.after_ids.pop(name, None)
+        if after_id:
+            self.scheduler.after_cancel(after_id)
+
+    def refresh_timeline(self):
+        """Periodically redraw the timeline so it scrolls with live time."""
+        self.timeline.redraw()
+        self._after('timeline', 1000, self.refresh_timeline)
 
     def update_log_box(self):
         """Update the log display with recent entries."""
@@ -287,13 +466,69 @@ class TrafficLightGUI:
         self.log_box.delete(1.0, tk.END)
         
         # Show last 100 entries
-        for entry in self.log_entries[-100:]:
+        for entry in self.log_entries:
             log_line = f"[{entry['time']}] {entry['direction']} | Light: {entry['light']} | Data: {entry['data']}\n"
             self.log_box.insert(tk.END, log_line)
         
         self.log_box.config(state='disabled')
         self.log_box.see(tk.END)
 
+    def export_journal(self):
+        """Export the packet journal to CSV or a columnar file on a background thread."""
+        if not self.journal_path:
+            messagebox.showinfo("Export", "Start with --journal FILE to record packets for export.")
+            return
+        if self.export_thread and self.export_thread.is_alive():
+            if messagebox.askyesno("Export", "An export is already running. Cancel it?"):
+                self.export_cancel.set()
+            return
+        
+        filetypes = [("CSV", "*.csv")]
+        if export.pa is not None:
+            filetypes += [("Parquet", "*.parquet"), ("Arrow IPC", "*.arrow")]
+        filetypes.append(("NumPy columns (directory)", "*.npy"))
+        output = filedialog.asksaveasfilename(
+            title="Export journal", defaultextension=".csv", filetypes=filetypes
+        )
+        if not output:
+            return
+        
+        if self.journal:
+            self.journal.flush()  # Include everything received so far
+        self.export_progress = (0, 0)
+        self.export_error = None
+        self.export_cancel.clear()
+        self.export_thread = threading.Thread(
+            target=self._run_export, args=(output,), name='export', daemon=True
+        )
+        self.export_thread.start()
+        self.update_export_label()
+
+    def _run_export(self, output):
+        # Runs on the export thread; only plain attributes are touched here,
+        # the label is updated from the Tk thread by update_export_label()
+        def progress(done, total):
+            self.export_progress = (done, total)
+        try:
+            export.export(self.journal_path, output, progress=progress, cancel=self.export_cancel)
+        except Exception as e:
+            # Anything, e.g. struct.error from a truncated journal, must reach the dialog
+            self.export_error = str(e) or type(e).__name__
+
+    def update_export_label(self):
+        """Show export progress until the background export finishes."""
+        done, total = self.export_progress
+        if self.export_thread.is_alive():
+            self.export_label.config(text=f"Exporting... {done:,} / {total:,} packets")
+            self._after('export', 200, self.update_export_label)
+        elif self.export_error:
+            self.export_label.config(text="")
+            messagebox.showerror("Export failed", self.export_error)
+        elif self.export_cancel.is_set():
+            self.export_label.config(text="Export cancelled")
+        else:
+            self.export_label.config(text=f"Exported {done:,} packets")
+
     def manual_override(self, light, road):
         """
         Handle manual override button press.
@@ -314,6 +549,17 @@ class TrafficLightGUI:
 
     def on_close(self):
         """Handle application close event."""
+        self.shutdown()
+        self.root.destroy()
+
+    def shutdown(self):
+        """Stop every periodic task and close the server, journal and controller."""
+        for name in list(self.after_ids):
+            self._cancel(name)
+        self.export_cancel.set()  # A running export removes its partial output
+        if self.server:
+            self.server.stop()
+        if self.journal:
+            self.journal.close()
         if self.controller:
             self.controller.close()
-        self.root.destroy()
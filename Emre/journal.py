@@ -0,0 +1,358 @@
+"""
+Packet journal for the traffic light simulator.
+
+Every packet is appended to a file of fixed-size records. A sidecar index is
+built alongside it while recording: a sparse (time, record) entry every few
+records plus one entry per phase transition, override and link change. Time
+range queries bisect the sparse index and map only the matching slice of the
+journal; transition and override queries are answered from the index alone.
+"""
+import argparse
+import mmap
+import os
+import struct
+import threading
+import time
+from bisect import bisect_left, bisect_right
+from datetime import datetime
+from protocol import DIRECTIONS, LIGHTS, MAX_DATA, RECORD
+from event_bus import TOPIC_RAW_FRAME
+
+INDEX_ENTRY = struct.Struct('<BBdQ')  # kind, light, time, record number
+
+INDEX_SPARSE, INDEX_TRANSITION, INDEX_OVERRIDE, INDEX_LINK = range(4)
+
+
+def index_path(path):
+    """Return the sidecar index path for a journal file."""
+    return path + '.idx'
+
+
+class JournalWriter:
+    """Appends packets to a journal and keeps its sidecar index up to date."""
+
+    def __init__(self, path, sparse_every=256, flush_interval=1.0):
+        """
+        Open a journal for appending, creating it if needed.
+
+        Args:
+            path: Journal file path; the index is written to path + '.idx'
+            sparse_every: Records between two sparse time index entries
+            flush_interval: Maximum seconds between flushes to disk
+        """
+        self.path = path
+        self.sparse_every = sparse_every
+        self.flush_interval = flush_interval
+        self.lock = threading.Lock()
+        self.controller = None
+        self.subscription = None
+        self._seed = None
+
+        self.records = open(path, 'ab')
+        # Drop a partial trailing record left by a crash
+        size = self.records.tell()
+        if size % RECORD.size:
+            self.records.truncate(size - size % RECORD.size)
+            self.records.seek(0, os.SEEK_END)
+        self.count = self.records.tell() // RECORD.size
+        self._repair_index()
+        self.index = open(index_path(path), 'ab')
+        self.last_phase = None
+        self.last_flush = time.monotonic()
+
+    def _repair_index(self):
+        # A torn trailing entry would misalign every entry appended after it,
+        # and entries may point at records dropped above. Entries are written
+        # in record order, so only the tail needs checking.
+        path = index_path(self.path)
+        if not os.path.exists(path):
+            return
+        size = os.path.getsize(path)
+        keep = size - size % INDEX_ENTRY.size
+        with open(path, 'rb') as f:
+            while keep:
+                f.seek(keep - INDEX_ENTRY.size)
+                if INDEX_ENTRY.unpack(f.read(INDEX_ENTRY.size))[3] < self.count:
+                    break
+                keep -= INDEX_ENTRY.size
+        if keep != size:
+            os.truncate(path, keep)
+
+    def record(self, direction, light, data, timestamp=None):
+        """
+        Append one packet.
+
+        Args:
+            direction: 'IN', 'OUT' or 'LINK'
+            light: Light or link state
+            data: Raw packet data, truncated to 32 bytes
+            timestamp: Wall-clock time (time.time()) of the packet, now by default
+        """
+        timestamp = time.time() if timestamp is None else timestamp
+        with self.lock:
+            self._append(direction, light, data, timestamp)
+
+    def _append(self, direction, light, data, timestamp):
+        # Called with the lock held
+        data = bytes(data or b'')[:MAX_DATA]
+        light_code = LIGHTS.index(light) if light in LIGHTS else 0
+        number = self.count
+        self.records.write(RECORD.pack(
+            timestamp, DIRECTIONS.index(direction), light_code, len(data), data
+        ))
+        self.count += 1
+
+        if number % self.sparse_every == 0:
+            self._index(INDEX_SPARSE, light_code, timestamp, number)
+        if direction == 'IN' and light in ('RED', 'GREEN') and light != self.last_phase:
+            self._index(INDEX_TRANSITION, light_code, timestamp, number)
+            self.last_phase = light
+        elif direction == 'OUT' and light in ('RED', 'GREEN'):
+            self._index(INDEX_OVERRIDE, light_code, timestamp, number)
+        elif direction == 'LINK':
+            self._index(INDEX_LINK, light_code, timestamp, number)
+            self.last_phase = None
+
+        if time.monotonic() - self.last_flush >= self.flush_interval:
+            self._flush()
+
+    def _index(self, kind, light_code, timestamp, number):
+        self.index.write(INDEX_ENTRY.pack(kind, light_code, timestamp, number))
+
+    def _flush(self):
+        # Records first, so the index never points past the end of the journal
+        self.records.flush()
+        self.index.flush()
+        self.last_flush = time.monotonic()
+
+    def flush(self):
+        """Write buffered records and index entries to disk."""
+        with self.lock:
+            self._flush()
+
+    def attach(self, controller):
+        """
+        Record every packet seen by a controller.
+
+        Args:
+            controller: TrafficLightController to subscribe to
+        """
+        def wall_time(event):
+            return time.time() - (time.monotonic() - event.timestamp)
+
+        def on_event(event):
+            with self.lock:
+                if event == self._seed:
+                    return  # Already recorded below
+                self._append(event.direction, event.light, event.data, wall_time(event))
+
+        self.subscription = controller.subscribe(
+            on_event, topics=(TOPIC_RAW_FRAME,), maxsize=10000, name='journal'
+        )
+        self.controller = controller
+
+        # The frame that started the current phase usually arrived before the
+        # subscription; record it so its transition is indexed
+        frame = controller.phase_frame
+        if frame is not None:
+            with self.lock:
+                if self.last_phase is None:
+                    self._seed = frame
+                    self._append(frame.direction, frame.light, frame.data, wall_time(frame))
+        return self
+
+    def close(self):
+        """Detach from the controller and close the files."""
+        if self.subscription:
+            self.controller.unsubscribe(self.subscription)
+            self.subscription = None
+        with self.lock:
+            self._flush()
+            self.records.close()
+            self.index.close()
+
+
+class JournalReader:
+    """Answers time and transition queries from a journal and its index."""
+
+    def __init__(self, path):
+        """
+        Open a journal for querying.
+
+        Args:
+            path: Journal file path
+        """
+        self.path = path
+        self.file = open(path, 'rb')
+        self.refresh()
+
+    def refresh(self):
+        """Pick up records and index entries written since the last call."""
+        self.count = os.fstat(self.file.fileno()).st_size // RECORD.size
+
+        self.sparse_times, self.sparse_records = [], []
+        self.events = {INDEX_TRANSITION: ([], []), INDEX_OVERRIDE: ([], []), INDEX_LINK: ([], [])}
+        try:
+            with open(index_path(self.path), 'rb') as f:
+                raw = f.read()
+        except FileNotFoundError:
+            raw = b''
+        usable = len(raw) - len(raw) % INDEX_ENTRY.size
+        for kind, light, timestamp, number in INDEX_ENTRY.iter_unpack(raw[:usable]):
+            if number >= self.count:
+                continue
+            if kind == INDEX_SPARSE:
+                self.sparse_times.append(timestamp)
+                self.sparse_records.append(number)
+            else:
+                times, entries = self.events[kind]
+                times.append(timestamp)
+                entries.append((timestamp, LIGHTS[light], number))
+
+    def _decode(self, raw):
+        timestamp, direction, light, length, data = raw
+        return (timestamp, DIRECTIONS[direction], LIGHTS[light], data[:length])
+
+    def read(self, number):
+        """
+        Return a single record.
+
+        Args:
+            number: Record number, starting at 0
+
+        Returns:
+            tuple: (time, direction, light, data)
+        """
+        self.file.seek(number * RECORD.size)
+        return self._decode(RECORD.unpack(self.file.read(RECORD.size)))
+
+    def record_range(self, start=None, end=None):
+        """
+        Return the record numbers [first, last) that may hold times in [start, end].
+
+        Only the sparse index is consulted, so the range is a superset.
+        """
+        first, last = 0, self.count
+        if start is not None and self.sparse_times:
+            position = bisect_right(self.sparse_times, start) - 1
+            if position >= 0:
+                first = self.sparse_records[position]
+        if end is not None and self.sparse_times:
+            position = bisect_right(self.sparse_times, end)
+            if position < len(self.sparse_records):
+                last = self.sparse_records[position]
+        return first, last
+
+    def between(self, start=None, end=None):
+        """
+        Return all records with start <= time <= end.
+
+        Args:
+            start: Wall-clock start time, unbounded if None
+            end: Wall-clock end time, unbounded if None
+
+        Returns:
+            list: (time, direction, light, data) tuples in journal order
+        """
+        first, last = self.record_range(start, end)
+        if first >= last:
+            return []
+        # Map only the pages holding the candidate records
+        begin = first * RECORD.size
+        offset = begin - begin % mmap.ALLOCATIONGRANULARITY
+        length = last * RECORD.size - offset
+        with mmap.mmap(self.file.fileno(), length, access=mmap.ACCESS_READ, offset=offset) as mapped:
+            view = memoryview(mapped)[begin - offset:]
+            try:
+                return [
+                    self._decode(raw) for raw in RECORD.iter_unpack(view)
+                    if (start is None or raw[0] >= start) and (end is None or raw[0] <= end)
+                ]
+            finally:
+                view.release()
+
+    def chunks(self, start=None, end=None, size=65536):
+        """
+        Stream the records with start <= time <= end in blocks of raw tuples.
+
+        Only one block is held in memory at a time, so journals of any size
+        can be exported.
+
+        Args:
+            start: Wall-clock start time, unbounded if None
+            end: Wall-clock end time, unbounded if None
+            size: Records read per block
+
+        Yields:
+            list: Undecoded (time, direction, light, length, data) tuples;
+            map codes with protocol.DIRECTIONS and protocol.LIGHTS
+        """
+        first, last = self.record_range(start, end)
+        for number in range(first, last, size):
+            self.file.seek(number * RECORD.size)
+            raw = self.file.read(min(size, last - number) * RECORD.size)
+            rows = list(RECORD.iter_unpack(raw))
+            if start is not None or end is not None:
+                rows = [row for row in rows
+                        if (start is None or row[0] >= start) and (end is None or row[0] <= end)]
+            if rows:
+                yield rows
+
+    def _indexed(self, kind, start, end):
+        times, entries = self.events[kind]
+        lo = 0 if start is None else bisect_left(times, start)
+        hi = len(times) if end is None else bisect_right(times, end)
+        return entries[lo:hi]
+
+    def transitions(self, start=None, end=None):
+        """Return (time, light, record number) for each phase transition in range."""
+        return self._indexed(INDEX_TRANSITION, start, end)
+
+    def overrides(self, start=None, end=None):
+        """Return (time, light, record number) for each override sent in range."""
+        return self._indexed(INDEX_OVERRIDE, start, end)
+
+    def link_changes(self, start=None, end=None):
+        """Return (time, state, record number) for each CONNECTED/DISCONNECTED in range."""
+        return self._indexed(INDEX_LINK, start, end)
+
+    def close(self):
+        """Close the journal file."""
+        self.file.close()
+
+
+def parse_time(text):
+    """Parse an ISO date/time given on the command line into a wall-clock time."""
+    return datetime.fromisoformat(text).timestamp()
+
+
+def main():
+    """Command-line query tool."""
+    parser = argparse.ArgumentParser(description="Query a traffic light packet journal")
+    parser.add_argument('journal', help="Journal file")
+    parser.add_argument('--start', type=parse_time, help="ISO start time, e.g. 2024-05-01T02:00")
+    parser.add_argument('--end', type=parse_time, help="ISO end time")
+    kind = parser.add_mutually_exclusive_group()
+    kind.add_argument('--transitions', action='store_true', help="Only phase transitions")
+    kind.add_argument('--overrides', action='store_true', help="Only overrides")
+    args = parser.parse_args()
+
+    reader = JournalReader(args.journal)
+    started = time.perf_counter()
+    if args.transitions or args.overrides:
+        query = reader.transitions if args.transitions else reader.overrides
+        rows = [(t, 'IN' if args.transitions else 'OUT', light, reader.read(number)[3])
+                for t, light, number in query(args.start, args.end)]
+    else:
+        rows = reader.between(args.start, args.end)
+    elapsed = time.perf_counter() - started
+
+    for timestamp, direction, light, data in rows:
+        stamp = datetime.fromtimestamp(timestamp).isoformat(sep=' ', timespec='milliseconds')
+        print(f"[{stamp}] {direction} | Light: {light} | Data: {data.hex(' ').upper()}")
+    print(f"{len(rows)} records in {elapsed * 1000:.1f} ms")
+    reader.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -6,15 +6,33 @@ This modular application consists of:
 - serial_comm.py: Serial communication handling
 - traffic_controller.py: Traffic light control logic
 - gui.py: User interface components
+- protocol.py: Protocol and timing profile
 """
+import argparse
+import multiprocessing
 import tkinter as tk
 from gui import TrafficLightGUI
+from protocol import DEFAULT_PROFILE, ProtocolProfile
 
 
 def main():
     """Main application entry point."""
+    parser = argparse.ArgumentParser(description="STM32 Traffic Light Simulator")
+    parser.add_argument('--profile', help="JSON protocol/timing profile (default: built-in)")
+    parser.add_argument('--isolated', action='store_true',
+                        help="Run serial I/O in a separate process so GUI load cannot delay ACKs")
+    parser.add_argument('--serve', type=int, metavar='PORT',
+                        help="Share the light state with other dashboards on this local TCP port")
+    parser.add_argument('--journal', metavar='FILE',
+                        help="Record every packet to an indexed journal (query with journal.py)")
+    args = parser.parse_args()
+    
+    # Load the protocol profile once; every module shares the compiled tables
+    profile = ProtocolProfile.load(args.profile) if args.profile else DEFAULT_PROFILE
+    
     root = tk.Tk()
-    app = TrafficLightGUI(root, baudrate=115200)
+    app = TrafficLightGUI(root, profile=profile, isolated=args.isolated, server_port=args.serve,
+                          journal_path=args.journal)
     
     # Handle window close event
     root.protocol("WM_DELETE_WINDOW", app.on_close)
@@ -24,4 +42,5 @@ def main():
 
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()  # Needed by the --isolated worker in PyInstaller builds
     main()
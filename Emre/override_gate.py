@@ -0,0 +1,96 @@
+"""
+Override request gate for the traffic light simulator.
+
+Operators double- and triple-click override buttons. Every override byte
+makes the firmware reset its phase and transmit a new frame, so requests are
+coalesced in a short window (the last one wins), dropped when the requested
+phase is already active and spaced at least a minimum interval apart.
+"""
+import time
+
+
+class OverrideGate:
+    """Coalesces, de-duplicates and rate-limits override requests for one intersection."""
+
+    def __init__(self, window=0.3, min_interval=1.0, clock=time.monotonic):
+        """
+        Initialize an idle gate.
+
+        Args:
+            window: Seconds requests are collected before the last one is sent
+            min_interval: Minimum seconds between two overrides sent to the device
+            clock: Function returning the current time in seconds
+        """
+        self.window = window
+        self.min_interval = min_interval
+        self.clock = clock
+        self.pending = None
+        self.deadline = None  # When the pending request is due, None if idle
+        self.last_sent = None
+
+        self.requested = 0
+        self.sent = 0
+        self.coalesced = 0     # Replaced by a later request in the same window
+        self.noop = 0          # Asked for the phase that was already active
+        self.rate_limited = 0  # Held back beyond the window by min_interval
+
+    def request(self, light, active):
+        """
+        Register an override request.
+
+        Args:
+            light: 'RED' or 'GREEN'
+            active: Phase currently reported by the device, or None if unknown
+
+        Returns:
+            float: Time at which pop() should be called, or None if nothing is pending
+        """
+        self.requested += 1
+        if self.pending is not None:
+            # Last one wins; the window keeps its original deadline
+            self.coalesced += 1
+            self.pending = light
+            return self.deadline
+        if light == active:
+            self.noop += 1
+            return None
+
+        now = self.clock()
+        self.pending = light
+        self.deadline = now + self.window
+        if self.last_sent is not None and self.last_sent + self.min_interval > self.deadline:
+            self.deadline = self.last_sent + self.min_interval
+            self.rate_limited += 1
+        return self.deadline
+
+    def pop(self, active):
+        """
+        Take the pending request once its deadline has passed.
+
+        Args:
+            active: Phase currently reported by the device, or None if unknown
+
+        Returns:
+            str: Light to send, or None if nothing should be sent
+        """
+        light, self.pending, self.deadline = self.pending, None, None
+        if light is None:
+            return None
+        if light == active:
+            # The window ended on the phase that is already showing
+            self.noop += 1
+            return None
+        self.sent += 1
+        self.last_sent = self.clock()
+        return light
+
+    def stats(self):
+        """Return request counters; suppressed = coalesced + noop."""
+        return {
+            'requested': self.requested,
+            'sent': self.sent,
+            'coalesced': self.coalesced,
+            'noop': self.noop,
+            'rate_limited': self.rate_limited,
+            'suppressed': self.coalesced + self.noop,
+        }
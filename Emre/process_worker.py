@@ -0,0 +1,324 @@
+"""
+Process-isolated serial I/O for the traffic light simulator.
+
+Runs SerialComm and the frame decoder in a separate process so ACKs are sent
+without waiting for the GUI process's GIL. Events come back through a
+shared-memory ring buffer; override commands go out through a pipe.
+"""
+import multiprocessing
+import struct
+import threading
+import time
+from multiprocessing import shared_memory
+import serial
+from serial_comm import SerialComm
+from protocol import DEFAULT_PROFILE, DIRECTIONS, LIGHTS, MAX_DATA, RECORD
+
+# Spawn everywhere: forking a process that already runs the GUI and
+# reader threads can deadlock the child, and it is what Windows uses anyway
+_context = multiprocessing.get_context('spawn')
+
+
+class EventRing:
+    """
+    Single-producer/single-consumer ring of fixed-size event records in shared memory.
+
+    Each side only ever writes its own sequence counter, so no lock is needed.
+    When the ring is full the producer drops the event instead of blocking.
+    """
+
+    HEADER = struct.Struct('<QQQ')  # write_seq, read_seq, dropped
+
+    def __init__(self, capacity=4096, name=None):
+        """
+        Create a new ring or attach to an existing one.
+
+        Args:
+            capacity: Number of records the ring holds
+            name: Shared memory block to attach to, or None to create one
+        """
+        self.capacity = capacity
+        size = self.HEADER.size + capacity * RECORD.size
+        self.owner = name is None
+        self.shm = shared_memory.SharedMemory(name=name, create=self.owner, size=size)
+        if self.owner:
+            self.HEADER.pack_into(self.shm.buf, 0, 0, 0, 0)
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def put(self, direction, light, data, timestamp=None):
+        """
+        Append an event; returns False if the ring is full and the event was dropped.
+
+        Args:
+            direction: One of DIRECTIONS
+            light: One of LIGHTS, anything else is stored as 'UNKNOWN'
+            data: Packet bytes, truncated to MAX_DATA
+            timestamp: Monotonic time of the event, now by default
+        """
+        buf = self.shm.buf
+        write_seq, read_seq, dropped = self.HEADER.unpack_from(buf, 0)
+        if write_seq - read_seq >= self.capacity:
+            struct.pack_into('<Q', buf, 16, dropped + 1)
+            return False
+        data = bytes(data or b'')[:MAX_DATA]
+        offset = self.HEADER.size + (write_seq % self.capacity) * RECORD.size
+        RECORD.pack_into(
+            buf, offset,
+            time.monotonic() if timestamp is None else timestamp,
+            DIRECTIONS.index(direction),
+            LIGHTS.index(light) if light in LIGHTS else 0,
+            len(data),
+            data,
+        )
+        # Publish the record only after it is fully written
+        struct.pack_into('<Q', buf, 0, write_seq + 1)
+        return True
+
+    def drain(self):
+        """
+        Remove and return all pending events.
+
+        Returns:
+            list: (timestamp, direction, light, data) tuples in arrival order
+        """
+        buf = self.shm.buf
+        write_seq, read_seq, _ = self.HEADER.unpack_from(buf, 0)
+        events = []
+        for seq in range(read_seq, write_seq):
+            offset = self.HEADER.size + (seq % self.capacity) * RECORD.size
+            timestamp, direction, light, length, data = RECORD.unpack_from(buf, offset)
+            events.append((timestamp, DIRECTIONS[direction], LIGHTS[light], data[:length]))
+        struct.pack_into('<Q', buf, 8, write_seq)
+        return events
+
+    def dropped(self):
+        """Return the number of events dropped because the ring was full."""
+        return self.HEADER.unpack_from(self.shm.buf, 0)[2]
+
+    def close(self):
+        """Detach from the ring; the creating side also frees it."""
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+def _worker_main(ring_name, capacity, ready, conn, port, baudrate, serial_factory, profile):
+    """Entry point of the I/O process."""
+    ring = EventRing(capacity, name=ring_name)
+
+    def publish(direction, light, data):
+        ring.put(direction, light, data)
+        ready.release()
+
+    try:
+        comm = SerialComm(publish, port=port, baudrate=baudrate,
+                          serial_factory=serial_factory, profile=profile)
+    except Exception as e:
+        # Anything, e.g. ValueError for a bad baud rate, must reach the parent
+        conn.send(('error', str(e) or type(e).__name__))
+        ring.close()
+        return
+    conn.send(('ok', None))
+
+    while True:
+        try:
+            command, argument = conn.recv()
+        except EOFError:
+            break
+        if command == 'override':
+            comm.send_override(argument)
+        elif command == 'close':
+            break
+
+    comm.close()
+    stats = {'reconnects': comm.reconnects, 'total_downtime': comm.total_downtime}
+    device = getattr(serial_factory, '__self__', None)
+    if hasattr(device, 'stats'):
+        stats['device'] = device.stats()
+    try:
+        conn.send(('stats', stats))
+    except (BrokenPipeError, OSError):
+        pass
+    ring.close()
+
+
+class ProcessSerialComm:
+    """Drop-in replacement for SerialComm that runs the serial I/O in a child process."""
+
+    def __init__(self, callback, port=None, baudrate=None, serial_factory=serial.Serial,
+                 profile=DEFAULT_PROFILE, capacity=4096, start_timeout=10.0):
+        """
+        Start the I/O process and the event dispatch thread.
+
+        Args:
+            callback: Function to call with (direction, light, data) events
+            port: COM port to use
+            baudrate: Baud rate for communication, the profile's by default
+            serial_factory: Picklable callable opening the port in the child
+            profile: ProtocolProfile describing frames, control bytes and timing
+            capacity: Number of events the shared-memory ring can buffer
+            start_timeout: Seconds to wait for the child to open the port
+
+        Raises:
+            serial.SerialException: The child could not open the port, died or
+                did not answer within start_timeout
+        """
+        self.callback = callback
+        self.profile = profile
+        self.running = True
+        self.worker_stats = None
+
+        self.connected = True
+        self.reconnects = 0
+        self.last_downtime = 0.0
+        self.total_downtime = 0.0
+        self._down_since = None
+
+        self.ring = EventRing(capacity)
+        # A bare semaphore rather than an Event: posting it takes no lock, so
+        # the child can exit at any point without wedging the dispatcher
+        self.ready = _context.Semaphore(0)
+        self.conn, child_conn = _context.Pipe()
+        self.process = _context.Process(
+            target=_worker_main,
+            args=(self.ring.name, capacity, self.ready, child_conn, port,
+                  baudrate, serial_factory, profile),
+            daemon=True,
+        )
+        self.process.start()
+        # Only the child holds the other end now, so its exit reads as EOF here
+        child_conn.close()
+
+        status, message = self._wait_started(start_timeout)
+        if status != 'ok':
+            if self.process.is_alive():
+                self.process.terminate()
+            self.process.join()
+            self.ring.close()
+            raise serial.SerialException(message)
+
+        self.thread = threading.Thread(target=self.dispatch_events, daemon=True)
+        self.thread.start()
+
+    def _wait_started(self, timeout):
+        deadline = time.monotonic() + timeout
+        while not self.conn.poll(0.1):
+            if not self.process.is_alive() and not self.conn.poll(0):
+                return 'error', f"I/O process exited with code {self.process.exitcode}"
+            if time.monotonic() >= deadline:
+                return 'error', f"I/O process did not start within {timeout} s"
+        try:
+            return self.conn.recv()
+        except EOFError:
+            return 'error', f"I/O process exited with code {self.process.exitcode}"
+
+    def dispatch_events(self):
+        """Deliver events from the ring to the callback in this process."""
+        while self.running:
+            if not self.ready.acquire(timeout=0.5):
+                continue
+            for _, direction, light, data in self.ring.drain():
+                if direction == 'LINK':
+                    self._track_link(light)
+                self.callback(direction, light, data)
+
+    def _track_link(self, state):
+        if state == 'DISCONNECTED':
+            self.connected = False
+            self._down_since = time.monotonic()
+        elif state == 'CONNECTED' and self._down_since is not None:
+            self.last_downtime = time.monotonic() - self._down_since
+            self.total_downtime += self.last_downtime
+            self.reconnects += 1
+            self.connected = True
+            self._down_since = None
+
+    def send_override(self, light):
+        """
+        Send manual override command to the device.
+
+        Args:
+            light: 'RED' or 'GREEN' light to override to
+        """
+        self.conn.send(('override', light))
+
+    def close(self):
+        """Stop the I/O process and release the shared memory."""
+        if not self.running:
+            return
+        self.running = False
+        try:
+            self.conn.send(('close', None))
+            if self.conn.poll(5):
+                _, self.worker_stats = self.conn.recv()
+        except (BrokenPipeError, EOFError, OSError):
+            pass
+        self.process.join(5)
+        self.thread.join()
+        self.ring.close()
+
+
+def _burn_gil(stop, pause):
+    """Simulate GUI load: repeated full GC passes over a large object graph."""
+    import gc
+    garbage = [{'i': i, 'items': [i] * 4} for i in range(300000)]
+    while not stop.is_set():
+        gc.collect()
+        time.sleep(pause)
+    del garbage
+
+
+def benchmark(seconds=5.0, load=True):
+    """
+    Compare ACK latency of the threaded and process-isolated modes.
+
+    Args:
+        seconds: Run time of each mode
+        load: Whether to simulate GC pauses in the GUI process
+
+    Returns:
+        dict: Emulator statistics per mode
+    """
+    from emulator import FirmwareEmulator
+    from protocol import ProtocolProfile
+
+    profile = ProtocolProfile(red_seconds=0.05, green_seconds=0.05)
+    results = {}
+    for mode in ('threaded', 'process'):
+        emulator = FirmwareEmulator(profile)
+        stop = threading.Event()
+        burner = threading.Thread(target=_burn_gil, args=(stop, 0.01), daemon=True)
+        if load:
+            burner.start()
+
+        comm_class = SerialComm if mode == 'threaded' else ProcessSerialComm
+        comm = comm_class(lambda *event: None, port='EMU',
+                          serial_factory=emulator.serial_factory, profile=profile)
+        time.sleep(seconds)
+        comm.close()
+        stop.set()
+        if load:
+            burner.join()
+
+        if mode == 'threaded':
+            results[mode] = emulator.stats()
+        else:
+            results[mode] = comm.worker_stats['device']
+    return results
+
+
+if __name__ == "__main__":
+    for mode, stats in benchmark().items():
+        # The first phase includes process start-up, leave it out
+        latencies = sorted(list(stats['ack_latencies'])[1:])
+        if not latencies:
+            print(f"{mode:>9}: no ACKs received")
+            continue
+        p50 = latencies[len(latencies) // 2]
+        p99 = latencies[int(len(latencies) * 0.99)]
+        retransmits = stats['frames_sent'] - len(stats['ack_latencies'])
+        print(f"{mode:>9}: {len(latencies)} phases, ACK latency p50 {p50:.1f} ms, "
+              f"p99 {p99:.1f} ms, max {latencies[-1]:.1f} ms, {retransmits} retransmits")
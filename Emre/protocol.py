@@ -0,0 +1,127 @@
+"""
+Protocol and timing profile for the traffic light simulator.
+
+Every frame layout, control byte and phase duration shared by the decoder,
+the ACK/override paths, the GUI countdown and the emulator lives here. A
+profile is loaded once at startup and compiled into lookup tables.
+"""
+import json
+import struct
+from utils import modbus_crc16
+
+# Compact codes for event fields in binary records (event ring, journal)
+DIRECTIONS = ('IN', 'OUT', 'LINK')
+LIGHTS = ('UNKNOWN', 'RED', 'GREEN', 'ACK', 'CHECK', 'CONNECTED', 'DISCONNECTED')
+MAX_DATA = 32
+RECORD = struct.Struct(f'<dBBB{MAX_DATA}s5x')  # time, direction, light, length, data
+
+
+def build_frame(signature):
+    """
+    Append the Modbus CRC to a signature, as the firmware does.
+
+    Args:
+        signature: The signature bytes
+
+    Returns:
+        bytes: The complete frame
+    """
+    crc = modbus_crc16(signature)
+    return bytes(signature) + bytes([crc & 0xFF, (crc >> 8) & 0xFF])
+
+
+def _parse_bytes(value):
+    """Accept either a hex string ("01 02 AC") or a list of ints."""
+    if isinstance(value, str):
+        return bytes.fromhex(value)
+    if isinstance(value, int):
+        return bytes([value])
+    return bytes(value)
+
+
+class ProtocolProfile:
+    """Frame layout, control bytes and phase timing of one firmware build."""
+
+    def __init__(self, frame_length=8, red_signature=b'\x01\x02\x03\x04\x05\x06',
+                 green_signature=b'\x06\x05\x04\x03\x02\x01', ack=0xAC,
+                 override_red=0x00, override_green=0x01, red_seconds=10,
+                 green_seconds=6, resend_ms=5, baudrate=115200):
+        """
+        Initialize and compile a protocol profile.
+
+        Args:
+            frame_length: Total frame length including the 2 CRC bytes
+            red_signature: Signature bytes of the RED frame
+            green_signature: Signature bytes of the GREEN frame
+            ack: Byte the host sends to acknowledge a frame
+            override_red: Byte requesting a RED override
+            override_green: Byte requesting a GREEN override
+            red_seconds: Duration of the RED phase
+            green_seconds: Duration of the GREEN phase
+            resend_ms: Firmware retransmit interval while waiting for an ACK
+            baudrate: Serial baud rate
+        """
+        red_signature = _parse_bytes(red_signature)
+        green_signature = _parse_bytes(green_signature)
+        for signature in (red_signature, green_signature):
+            if len(signature) != frame_length - 2:
+                raise ValueError(
+                    f"Signature {signature.hex(' ')} does not fit a {frame_length}-byte frame")
+        if red_signature == green_signature:
+            raise ValueError("RED and GREEN signatures must differ")
+        ack = _parse_bytes(ack)
+        override_red = _parse_bytes(override_red)
+        override_green = _parse_bytes(override_green)
+        controls = {'ack': ack, 'override_red': override_red, 'override_green': override_green}
+        for name, value in controls.items():
+            if len(value) != 1:
+                raise ValueError(f"{name} must be a single byte, got {value.hex(' ') or 'nothing'}")
+        if len(set(controls.values())) != len(controls):
+            raise ValueError("ack, override_red and override_green must be distinct bytes")
+
+        self.frame_length = frame_length
+        self.red_seconds = red_seconds
+        self.green_seconds = green_seconds
+        self.resend_ms = resend_ms
+        self.baudrate = baudrate
+
+        # Compiled tables
+        self.frame_by_light = {
+            'RED': build_frame(red_signature),
+            'GREEN': build_frame(green_signature),
+        }
+        self.light_by_frame = {frame: light for light, frame in self.frame_by_light.items()}
+        self.ack = ack
+        self.override_by_light = {'RED': override_red, 'GREEN': override_green}
+        self.light_by_override = {data[0]: light for light, data in self.override_by_light.items()}
+        self.phase_seconds = {'RED': red_seconds, 'GREEN': green_seconds}
+
+    @classmethod
+    def from_dict(cls, values):
+        """
+        Build a profile from a dictionary, e.g. parsed JSON.
+
+        Args:
+            values: Mapping of constructor argument names to values
+
+        Returns:
+            ProtocolProfile: The compiled profile
+        """
+        return cls(**values)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Load a profile from a JSON file.
+
+        Args:
+            path: Path to the JSON profile
+
+        Returns:
+            ProtocolProfile: The compiled profile
+        """
+        with open(path, encoding='utf-8') as f:
+            return cls.from_dict(json.load(f))
+
+
+DEFAULT_PROFILE = ProtocolProfile()
@@ -2,80 +2,216 @@
 Serial communication module for the traffic light simulator.
 """
 import threading
+import time
 import serial
 from utils import check_modbus_crc
+from protocol import DEFAULT_PROFILE
 
 
 class SerialComm:
     """Handles serial communication with the STM32 device."""
-    
-    def __init__(self, callback, port=None, baudrate=115200):
+
+    def __init__(self, callback, port=None, baudrate=None, serial_factory=serial.Serial,
+                 stall_timeout=None, max_backoff=2.0, profile=DEFAULT_PROFILE,
+                 clock=time.monotonic, sleep=None, start_thread=True):
         """
         Initialize serial communication.
-        
+
         Args:
             callback: Function to call when data is received
             port: COM port to use
-            baudrate: Baud rate for communication
+            baudrate: Baud rate for communication, the profile's by default
+            serial_factory: Callable opening the port, serial.Serial by default
+            stall_timeout: Seconds without a valid frame before the port is reopened,
+                by default the longest phase plus 2 seconds
+            max_backoff: Upper bound in seconds for the delay between reopen attempts
+            profile: ProtocolProfile describing frames, control bytes and timing
+            clock: Function returning the current time in seconds
+            sleep: Function waiting between reopen attempts, interruptible by
+                close() by default
+            start_thread: Start the reader thread; if False the owner calls poll()
         """
         self.callback = callback
+        self.port = port
+        self.profile = profile
+        self.baudrate = baudrate or profile.baudrate
+        self.serial_factory = serial_factory
+        if stall_timeout is None:
+            stall_timeout = max(profile.phase_seconds.values()) + 2.0
+        self.stall_timeout = stall_timeout
+        self.max_backoff = max_backoff
+        self.clock = clock
         self.running = True
-        self.ser = serial.Serial(port, baudrate, timeout=1)
-        self.thread = threading.Thread(target=self.read_serial, daemon=True)
-        self.thread.start()
+        self._stop_event = threading.Event()
+        self.sleep = sleep or self._stop_event.wait
+        self._write_failed = False
+        self._buffer = bytearray()
+
+        # Link health, readable from any thread; the link only counts as
+        # restored once the device sends a valid frame again
+        self.connected = True
+        self._down_since = None
+        self.reconnects = 0
+        self.last_downtime = 0.0
+        self.total_downtime = 0.0
+
+        self.ser = self.serial_factory(port, self.baudrate, timeout=1)
+        self._last_frame = self.clock()
+        self.thread = None
+        if start_thread:
+            self.thread = threading.Thread(target=self.read_serial, daemon=True)
+            self.thread.start()
 
     def read_serial(self):
         """
         Continuously read data from the serial port in a separate thread.
+
+        Read/write errors and stalls are handled by reopening the port, so the
+        thread only exits when close() is called.
         """
-        buffer = bytearray()
-        ack = bytes([0xAC])
-        
         while self.running:
-            incoming = self.ser.read(self.ser.in_waiting)
-            buffer.extend(incoming)
-            
-            if len(buffer) >= 8:
-                data = buffer[:8]
-                del buffer[:8]
-
-                byte_array = list(data)
-                if check_modbus_crc(data):
-                    
-                    if data[:6] == b'\x01\x02\x03\x04\x05\x06':
-                        light = 'RED'
-                        self.ser.write(ack)
-                    elif data[:6] == b'\x06\x05\x04\x03\x02\x01':
-                        light = 'GREEN'
-                        self.ser.write(ack)
-                    else:
-                        light = 'UNKNOWN'
-                    self.callback('IN', light, data)
-                    self.callback('OUT', 'ACK', bytes(ack))
+            self.poll(block=True)
+
+    def poll(self, block=False):
+        """
+        Read, decode and ACK whatever the port has buffered.
+
+        This is one iteration of the reader loop; it is called directly when
+        the reader thread is not started, e.g. under a virtual clock.
+
+        Args:
+            block: Wait up to the port timeout for at least one byte
+        """
+        buffer = self._buffer
+        ack = self.profile.ack
+        frame_length = self.profile.frame_length
+        light_by_frame = self.profile.light_by_frame
+
+        try:
+            if self._write_failed:
+                raise serial.SerialException("write failed")
+            waiting = self.ser.in_waiting
+            if waiting or block:
+                buffer.extend(self.ser.read(waiting or 1))
+
+            while len(buffer) >= frame_length:
+                data = bytes(buffer[:frame_length])
+                # Known frames are matched by table lookup, the CRC is only
+                # computed for anything else
+                light = light_by_frame.get(data)
+                if light is None:
+                    if not check_modbus_crc(data):
+                        # Out of sync: slide one byte until a frame boundary is found
+                        del buffer[:1]
+                        continue
+                    light = 'UNKNOWN'
+                del buffer[:frame_length]
+                self._last_frame = self.clock()
+
+                if light != 'UNKNOWN':
+                    self.ser.write(ack)
+                if not self.connected:
+                    self._restored()
+                self.callback('IN', light, data)
+                if light != 'UNKNOWN':
+                    # Only ACKs actually written are reported
+                    self.callback('OUT', 'ACK', ack)
+
+            if self.clock() - self._last_frame > self.stall_timeout:
+                raise serial.SerialException(f"no frames for {self.stall_timeout} s")
+        except (serial.SerialException, OSError) as e:
+            if not self.running:
+                return
+            buffer.clear()
+            self.reconnect(str(e))
+            self._last_frame = self.clock()
+
+    def reconnect(self, reason=''):
+        """
+        Reopen the port with bounded exponential backoff.
+
+        The link is reported CONNECTED, and the downtime closed out, by poll()
+        when the first valid frame arrives on the reopened port.
+
+        Args:
+            reason: Description of the failure, reported with the DISCONNECTED event
+        """
+        if self.connected:
+            # A port that reopens but stays silent is still down, so later
+            # stalls extend this outage instead of starting a new one
+            self.connected = False
+            self._down_since = self.clock()
+            self.callback('LINK', 'DISCONNECTED', reason.encode(errors='replace'))
+        self._close_quietly(self.ser)
+
+        delay = 0.05
+        while self.running:
+            ser = None
+            try:
+                ser = self.serial_factory(self.port, self.baudrate, timeout=1)
+                ser.reset_input_buffer()
+                break
+            except (serial.SerialException, OSError):
+                if ser is not None:
+                    self._close_quietly(ser)
+                self.sleep(delay)
+                delay = min(delay * 2, self.max_backoff)
+        else:
+            return
+
+        self.ser = ser
+        if not self.running:
+            # close() ran while the port was being reopened
+            self._close_quietly(ser)
+            return
+
+        self._write_failed = False
+
+    def _restored(self):
+        # First valid frame after an outage
+        self.last_downtime = self.clock() - self._down_since
+        self.total_downtime += self.last_downtime
+        self.reconnects += 1
+        self.connected = True
+        self.callback('LINK', 'CONNECTED', b'')
+
+    @staticmethod
+    def _close_quietly(ser):
+        try:
+            ser.close()
+        except (serial.SerialException, OSError):
+            pass
 
     def send_override(self, light):
         """
         Send manual override command to the device.
-        
+
         Args:
             light: 'RED' or 'GREEN' light to override to
         """
-        # Compose an 8-byte packet with the 3rd byte as the override request
-        # 0x00 for RED, 0x01 for GREEN
-        data = bytes([0x00]) if light == 'RED' else bytes([0x01])
-        self.ser.write(data)
+        data = self.profile.override_by_light[light]
+        try:
+            self.ser.write(data)
+        except (serial.SerialException, OSError):
+            # Let the reader thread reopen the port
+            self._write_failed = True
+            return
         self.callback('OUT', light, bytes(data))
 
     def close(self):
         """Close the serial connection and stop the reading thread."""
         self.running = False
+        self._stop_event.set()
         if hasattr(self, 'ser') and self.ser.is_open:
             self.ser.close()
+        # A blocked read returns within the port timeout
+        if self.thread and self.thread is not threading.current_thread():
+            self.thread.join(2)
 
     def ack_check(self, mode):
        if mode == 0: #check if the sender got the ack
            while(1):
-            self.ser.write(bytes([0xAC]))
-            self.callback('OUT', 'CHECK', bytes(bytes([0xAC])))
-            
+            self.ser.write(self.profile.ack)
+            self.callback('OUT', 'CHECK', self.profile.ack)
+
 
@@ -0,0 +1,253 @@
+"""
+Soak test for the traffic light simulator.
+
+The application runs for weeks on a kiosk, so anything that grows per packet,
+per phase or per reconnect eventually takes it down. This runs the full stack
+(GUI, controller, journal and state server) against the firmware emulator at
+an accelerated phase cycle, with an override click and a link reset in every
+sampling interval. Process and GUI resources are sampled after every
+interval, and the run fails if any of them grows past its threshold.
+
+By default everything runs on a virtual clock with an unthreaded controller,
+so hours of simulated time pass in seconds or minutes. That run has no
+reader, delivery or override timer threads, so only --threaded, which runs in
+real time with the controller as the application uses it, can catch thread
+and join leaks.
+
+    python soak.py --hours 24
+    python soak.py --hours 24 --headless    # without Tk, e.g. on a server
+    python soak.py --hours 1 --interval 60 --threaded
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+from protocol import ProtocolProfile
+from emulator import FirmwareEmulator
+from traffic_controller import TrafficLightController
+from virtual_clock import VirtualClock, SimulatedIntersection
+from journal import JournalWriter
+from state_server import StateServer
+
+SOAK_PROFILE = ProtocolProfile(red_seconds=0.5, green_seconds=0.3)
+
+# Allowed growth over the first sample, which is taken after one interval
+THRESHOLDS = {
+    'rss_mb': 32.0,
+    'threads': 0,
+    'fds': 0,
+    'canvas_items': 1800,  # The timeline legitimately draws up to three stripes per column
+    'after_queue': 2,      # The countdown chain pauses while the link is down
+}
+
+
+def _rss_mb():
+    """Return the resident set size in MB, or None where /proc is unavailable."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2**20
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def _open_fds():
+    """Return the number of open file descriptors, or None where /proc is unavailable."""
+    try:
+        return len(os.listdir('/proc/self/fd'))
+    except OSError:
+        return None
+
+
+def _canvases(widget):
+    import tkinter as tk
+    for child in widget.winfo_children():
+        if isinstance(child, tk.Canvas):
+            yield child
+        yield from _canvases(child)
+
+
+def sample(now, pending=0, app=None):
+    """
+    Measure the resources a leak would show up in.
+
+    Args:
+        now: Seconds since the start of the run
+        pending: Callbacks waiting on a virtual clock rather than on Tk
+        app: TrafficLightGUI, or None when running headless
+
+    Returns:
+        dict: Run time plus one value per THRESHOLDS key; None if unavailable
+    """
+    values = {
+        'time': now,
+        'rss_mb': _rss_mb(),
+        'threads': threading.active_count(),
+        'fds': _open_fds(),
+        'canvas_items': None,
+        'after_queue': pending,
+    }
+    if app:
+        values['canvas_items'] = sum(len(canvas.find_all()) for canvas in _canvases(app.root))
+        # Callbacks scheduled on Tk directly rather than through the scheduler
+        values['after_queue'] += len(app.root.tk.splitlist(app.root.tk.call('after', 'info')))
+    return values
+
+
+def check(samples, thresholds=THRESHOLDS):
+    """
+    Compare every sample against the first one.
+
+    Args:
+        samples: Dictionaries returned by sample()
+        thresholds: Allowed growth per metric
+
+    Returns:
+        list: Description of each metric that grew past its threshold
+    """
+    failures = []
+    baseline = samples[0]
+    for metric, limit in thresholds.items():
+        if baseline[metric] is None:
+            continue
+        peak = max(s[metric] for s in samples)
+        if peak - baseline[metric] > limit:
+            failures.append(f"{metric} grew from {baseline[metric]:.1f} to {peak:.1f} "
+                            f"(allowed +{limit})")
+    return failures
+
+
+def _wait(seconds, root=None):
+    """Let real time pass, keeping Tk responsive if there is a window."""
+    deadline = time.monotonic() + seconds
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return
+        if root:
+            root.update()
+            time.sleep(min(remaining, 0.02))
+        else:
+            time.sleep(remaining)
+
+
+def run_soak(hours=4.0, interval=600.0, gui=True, profile=SOAK_PROFILE, report=None,
+             threaded=False):
+    """
+    Run the application against the emulator and sample its resources.
+
+    Args:
+        hours: Duration, simulated unless threaded
+        interval: Seconds between samples, simulated unless threaded
+        gui: Include the Tk GUI; needs a display
+        profile: Firmware profile, a fast phase cycle by default
+        report: Optional function called with each sample
+        threaded: Run in real time with the reader, bus delivery and override
+            timer threads instead of on a virtual clock
+
+    Returns:
+        list: The samples, first one after the first interval
+    """
+    clock = None if threaded else VirtualClock()
+    started = time.monotonic()
+    directory = tempfile.mkdtemp(prefix='soak-')
+    journal_path = os.path.join(directory, 'soak.journal')
+    root = app = server = journal = sim = None
+
+    if gui:
+        import tkinter as tk
+        from gui import TrafficLightGUI
+        root = tk.Tk()
+        app = TrafficLightGUI(root, profile=profile, server_port=0, journal_path=journal_path,
+                              scheduler=clock, clock=clock.monotonic if clock else time.monotonic)
+    if threaded:
+        device = FirmwareEmulator(profile)
+        controller = TrafficLightController(app.queue_event if app else None, port='EMU',
+                                            profile=profile, serial_factory=device.serial_factory)
+    else:
+        device = sim = SimulatedIntersection(profile, clock,
+                                             callback=app.log_event if app else None)
+        controller = sim.controller
+    if app:
+        app.attach_controller(controller)
+    else:
+        server = StateServer(controller, port=0).start()
+        journal = JournalWriter(journal_path).attach(controller)
+
+    samples = []
+    light = 'GREEN'
+    try:
+        for _ in range(max(int(hours * 3600 / interval + 1e-9), 2)):
+            for quarter in range(4):
+                if quarter == 1:
+                    # Early, so the override timer thread is gone by the sample
+                    light = 'RED' if light == 'GREEN' else 'GREEN'
+                    if app:
+                        app.manual_override(light, 'Main')
+                    else:
+                        controller.manual_override(light)
+                elif quarter == 2:
+                    device.disconnect(0.5)
+                if sim:
+                    sim.wake()
+                    sim.run(interval / 4)
+                    if root:
+                        root.update()
+                else:
+                    _wait(interval / 4, root)
+            if clock:
+                samples.append(sample(clock.monotonic(), clock.pending(), app))
+            else:
+                samples.append(sample(time.monotonic() - started, 0, app))
+            if report:
+                report(samples[-1])
+    finally:
+        if app:
+            app.on_close()
+        else:
+            server.stop()
+            journal.close()
+            controller.close()
+        for name in os.listdir(directory):
+            os.remove(os.path.join(directory, name))
+        os.rmdir(directory)
+    return samples
+
+
+def _print_sample(values):
+    def show(value, unit=''):
+        if value is None:
+            return 'n/a'
+        return f"{value:.1f}{unit}" if isinstance(value, float) else f"{value}{unit}"
+    print(f"{values['time'] / 3600:7.2f} h  rss {show(values['rss_mb'], ' MB'):>9}  "
+          f"threads {show(values['threads']):>3}  fds {show(values['fds']):>4}  "
+          f"canvas {show(values['canvas_items']):>5}  after {show(values['after_queue']):>3}")
+
+
+def main():
+    """Command-line soak test; exits with status 1 if a threshold is exceeded."""
+    parser = argparse.ArgumentParser(description="Soak-test the traffic light simulator")
+    parser.add_argument('--hours', type=float, default=4.0, help="Simulated hours (default: 4)")
+    parser.add_argument('--interval', type=float, default=600.0,
+                        help="Simulated seconds between samples (default: 600)")
+    parser.add_argument('--headless', action='store_true', help="Run without the Tk GUI")
+    parser.add_argument('--threaded', action='store_true',
+                        help="Run in real time with the controller's threads, to catch thread leaks")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    samples = run_soak(args.hours, args.interval, gui=not args.headless, report=_print_sample,
+                       threaded=args.threaded)
+    failures = check(samples)
+    kind = 'real' if args.threaded else 'simulated'
+    print(f"{args.hours} {kind} hours in {time.perf_counter() - started:.1f} s")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    if failures:
+        sys.exit(1)
+    print("No resource growth past the thresholds")
+
+
+if __name__ == "__main__":
+    main()
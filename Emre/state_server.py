@@ -0,0 +1,311 @@
+"""
+Local network state server for the traffic light simulator.
+
+Lets any number of dashboards follow the one controller that owns the serial
+port. Clients connect over TCP and receive newline-delimited JSON: first a
+snapshot of the current state, then one message per event.
+"""
+import asyncio
+import json
+import threading
+import time
+from collections import deque
+from event_bus import TOPIC_PHASE_CHANGE, TOPIC_OVERRIDE, TOPIC_LINK, TOPIC_ERROR
+
+STATE_TOPICS = (TOPIC_PHASE_CHANGE, TOPIC_OVERRIDE, TOPIC_LINK, TOPIC_ERROR)
+
+
+def _encode(message):
+    return (json.dumps(message, separators=(',', ':')) + '\n').encode()
+
+
+class _Client:
+    """One connected dashboard and its bounded outgoing queue."""
+
+    def __init__(self, writer, max_pending):
+        self.writer = writer
+        self.max_pending = max_pending
+        self.pending = deque()
+        self.wakeup = asyncio.Event()
+        self.resync = False
+        self.resyncs = 0
+        self.closed = False
+        self.task = asyncio.current_task()
+
+    async def watch_eof(self, reader):
+        # Dashboards never send anything; EOF means they went away
+        try:
+            await reader.read()
+        finally:
+            self.closed = True
+            self.wakeup.set()
+
+    def push(self, message):
+        if self.resync:
+            return  # A snapshot is coming anyway
+        if len(self.pending) >= self.max_pending:
+            # Too slow to keep up: drop its backlog and send current state instead
+            self.pending.clear()
+            self.resync = True
+            self.resyncs += 1
+        else:
+            self.pending.append(message)
+        self.wakeup.set()
+
+
+class StateServer:
+    """Broadcasts controller state to TCP clients on a background asyncio loop."""
+
+    def __init__(self, controller, host='127.0.0.1', port=8765, history=50, max_pending=64):
+        """
+        Initialize the server; call start() to begin serving.
+
+        Args:
+            controller: TrafficLightController whose events are published
+            host: Interface to listen on, localhost by default
+            port: TCP port, 0 to pick a free one
+            history: Number of recent events included in the snapshot
+            max_pending: Messages queued per client before it is resynced
+        """
+        self.controller = controller
+        self.host = host
+        self.port = port
+        self.max_pending = max_pending
+
+        # Seeded from the controller by start(), then kept current by events
+        self.phase = None
+        self.phase_since = None
+        self.link = 'CONNECTED'
+        self.seq = 0
+        self.recent = deque(maxlen=history)
+        self._snapshot = None
+
+        self.clients = set()
+        self.loop = None
+        self.server = None
+        self.subscription = None
+        self.thread = None
+        self.error = None
+        self._started = threading.Event()
+
+    def start(self, timeout=5.0):
+        """
+        Start listening and subscribe to the controller.
+
+        Args:
+            timeout: Seconds to wait for the listening socket
+
+        Returns:
+            StateServer: self
+
+        Raises:
+            OSError: The socket could not be opened, e.g. the port is in use
+            RuntimeError: The server did not start within the timeout
+        """
+        self.thread = threading.Thread(target=self._run, name='state-server', daemon=True)
+        self.thread.start()
+        if not self._started.wait(timeout):
+            raise RuntimeError(f"State server did not start within {timeout} s")
+        if self.error:
+            raise self.error
+        self.subscription = self.controller.subscribe(
+            self._on_event, topics=STATE_TOPICS, name='state-server-events'
+        )
+        # Events published before subscribing are missed; take their effect
+        # from the controller instead
+        self.loop.call_soon_threadsafe(self._seed)
+        return self
+
+    def _run(self):
+        self.loop = asyncio.new_event_loop()
+        try:
+            self.server = self.loop.run_until_complete(
+                asyncio.start_server(self._handle_client, self.host, self.port)
+            )
+            self.port = self.server.sockets[0].getsockname()[1]
+        except Exception as e:
+            # Raised again by start() on the caller's thread
+            self.error = e
+            self.loop.close()
+            return
+        finally:
+            self._started.set()
+        self.loop.run_forever()
+        self.loop.run_until_complete(self.loop.shutdown_asyncgens())
+        self.loop.close()
+
+    def _on_event(self, event):
+        # Called on the bus delivery thread
+        self.loop.call_soon_threadsafe(self._apply, event)
+
+    def _seed(self):
+        # Runs on the loop: events applied so far are no newer than the state
+        # read here, and events still queued are applied on top in order
+        frame = self.controller.phase_frame
+        self.phase = frame.light if frame else None
+        self.phase_since = time.time() - (time.monotonic() - frame.timestamp) if frame else None
+        self.link = 'CONNECTED' if self.controller.serial.connected else 'DISCONNECTED'
+        self._snapshot = None
+
+    def _apply(self, event):
+        """Update the state and broadcast one serialized delta to every client."""
+        wall_time = time.time() - (time.monotonic() - event.timestamp)
+        if event.topic == TOPIC_PHASE_CHANGE:
+            self.phase = event.light
+            self.phase_since = wall_time
+        elif event.topic == TOPIC_LINK:
+            self.link = event.light
+            if event.light == 'DISCONNECTED':
+                self.phase = None
+
+        self.seq += 1
+        record = {
+            'seq': self.seq,
+            'topic': event.topic,
+            'direction': event.direction,
+            'light': event.light,
+            'data': bytes(event.data or b'').hex(' ').upper(),
+            'time': wall_time,
+        }
+        self.recent.append(record)
+        self._snapshot = None
+
+        message = _encode(dict(record, type='event'))
+        for client in self.clients:
+            client.push(message)
+
+    def snapshot(self):
+        """Return the current state serialized once and shared by every client."""
+        if self._snapshot is None:
+            self._snapshot = _encode({
+                'type': 'snapshot',
+                'seq': self.seq,
+                'phase': self.phase,
+                'phase_since': self.phase_since,
+                'link': self.link,
+                'events': list(self.recent),
+            })
+        return self._snapshot
+
+    async def _handle_client(self, reader, writer):
+        client = _Client(writer, self.max_pending)
+        self.clients.add(client)
+        watcher = asyncio.create_task(client.watch_eof(reader))
+        try:
+            writer.write(self.snapshot())
+            await writer.drain()
+            while True:
+                await client.wakeup.wait()
+                client.wakeup.clear()
+                if client.closed:
+                    break
+                if client.resync:
+                    client.resync = False
+                    writer.write(self.snapshot())
+                while client.pending:
+                    writer.write(client.pending.popleft())
+                # Waiting here is the backpressure: a slow reader fills its
+                # own queue and gets resynced, nobody else waits for it
+                await writer.drain()
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            watcher.cancel()
+            self.clients.discard(client)
+            writer.close()
+
+    def stop(self):
+        """Unsubscribe, disconnect all clients and stop the loop."""
+        if self.subscription:
+            self.controller.unsubscribe(self.subscription)
+            self.subscription = None
+        if self.loop and self.loop.is_running():
+            async def shutdown():
+                self.server.close()
+                tasks = [client.task for client in self.clients]
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+                await self.server.wait_closed()
+                self.loop.stop()
+            asyncio.run_coroutine_threadsafe(shutdown(), self.loop)
+            self.thread.join(5)
+
+
+def _run_clients(port, count, seconds, results):
+    """Connect `count` dashboards and count the messages they receive."""
+    async def client(counts):
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                counts.append(json.loads(line)['type'])
+        finally:
+            writer.close()
+
+    async def main():
+        counts = []
+        tasks = [asyncio.create_task(client(counts)) for _ in range(count)]
+        await asyncio.sleep(seconds)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        results.put((counts.count('snapshot'), counts.count('event')))
+
+    asyncio.run(main())
+
+
+def load_test(clients=300, seconds=5.0):
+    """
+    Measure ACK latency on the serial side with and without many dashboards.
+
+    The dashboards run in a separate process, as they would on other machines.
+
+    Args:
+        clients: Number of concurrent TCP subscribers
+        seconds: Duration of each run
+
+    Returns:
+        dict: ACK latency samples per run plus message counts
+    """
+    import multiprocessing
+    from emulator import FirmwareEmulator
+    from protocol import ProtocolProfile
+    from traffic_controller import TrafficLightController
+
+    context = multiprocessing.get_context('spawn')
+    profile = ProtocolProfile(red_seconds=0.05, green_seconds=0.05)
+    results = {}
+    for run in ('baseline', 'server'):
+        emulator = FirmwareEmulator(profile)
+        controller = TrafficLightController(None, port='EMU', profile=profile,
+                                            serial_factory=emulator.serial_factory)
+        server = None
+        if run == 'server':
+            server = StateServer(controller, port=0).start()
+            queue = context.Queue()
+            process = context.Process(target=_run_clients,
+                                      args=(server.port, clients, seconds, queue))
+            process.start()
+        time.sleep(seconds)
+        if server:
+            snapshots, events = queue.get(timeout=30)
+            process.join()
+            results['messages'] = {'snapshots': snapshots, 'events': events}
+            server.stop()
+        controller.close()
+        results[run] = list(emulator.stats()['ack_latencies'])[1:]
+    return results
+
+
+if __name__ == "__main__":
+    results = load_test()
+    for run in ('baseline', 'server'):
+        latencies = sorted(results[run])
+        p50 = latencies[len(latencies) // 2]
+        p99 = latencies[int(len(latencies) * 0.99)]
+        print(f"{run:>8}: {len(latencies)} phases, ACK latency p50 {p50:.1f} ms, p99 {p99:.1f} ms")
+    messages = results['messages']
+    print(f"Clients received {messages['snapshots']} snapshots and {messages['events']} events")
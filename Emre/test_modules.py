@@ -60,13 +60,581 @@ def test_classes():
         print(f"✗ Error testing classes: {e}")
         return False
 
+def test_protocol_profile():
+    """Test that a profile compiles into the frame and control tables."""
+    from protocol import DEFAULT_PROFILE, ProtocolProfile
+    from utils import check_modbus_crc
+    
+    print("\nTesting protocol profile...")
+    red = DEFAULT_PROFILE.frame_by_light['RED']
+    assert red[:6] == b'\x01\x02\x03\x04\x05\x06' and check_modbus_crc(red)
+    assert DEFAULT_PROFILE.light_by_frame[red] == 'RED'
+    assert DEFAULT_PROFILE.ack == b'\xac'
+    assert DEFAULT_PROFILE.phase_seconds == {'RED': 10, 'GREEN': 6}
+    print("✓ Default profile matches the firmware")
+    
+    fast = ProtocolProfile.from_dict({'red_seconds': 2, 'ack': 'AB', 'red_signature': '0A 0B 0C 0D 0E 0F'})
+    assert fast.phase_seconds['RED'] == 2 and fast.ack == b'\xab'
+    assert fast.frame_by_light['RED'][:6] == bytes.fromhex('0A0B0C0D0E0F')
+    for bad in ({'red_signature': b'\x01\x02'}, {'ack': 'AC AC'},
+                {'override_green': 0x00}, {'ack': 0x01}):
+        try:
+            ProtocolProfile(**bad)
+        except ValueError:
+            pass
+        else:
+            raise AssertionError(f"invalid profile accepted: {bad}")
+    print("✓ Custom profiles compile and are validated")
+    return True
+
+def test_countdown():
+    """Test that the countdown is derived from the clock, not from ticks."""
+    from countdown import PhaseCountdown
+    
+    print("\nTesting phase countdown...")
+    now = [100.0]
+    countdown = PhaseCountdown(clock=lambda: now[0])
+    assert countdown.display() == ""
+    countdown.start('RED', 10)
+    assert countdown.display() == "10"
+    now[0] += 0.25
+    assert countdown.display() == "10" and abs(countdown.until_next_change() - 0.75) < 1e-9
+    now[0] += 7.5  # a stalled main loop skips several redraws
+    assert countdown.display() == "3"
+    now[0] += 5
+    assert countdown.display() == "0" and countdown.until_next_change() is None
+    print("✓ Countdown stays accurate across missed redraws")
+    return True
+
+def test_event_ring():
+    """Test the shared-memory event ring used by the isolated I/O worker."""
+    from process_worker import EventRing
+    
+    print("\nTesting shared-memory event ring...")
+    ring = EventRing(capacity=4)
+    reader = EventRing(capacity=4, name=ring.name)
+    try:
+        assert ring.put('IN', 'RED', b'\x01\x02\x03', timestamp=1.5)
+        assert ring.put('LINK', 'SOMETHING ELSE', b'')
+        events = reader.drain()
+        assert events[0] == (1.5, 'IN', 'RED', b'\x01\x02\x03')
+        assert events[1][1:] == ('LINK', 'UNKNOWN', b'')
+        assert reader.drain() == []
+        print("✓ Events round-trip through shared memory")
+        
+        for _ in range(5):
+            ring.put('OUT', 'ACK', b'\xac')
+        assert len(reader.drain()) == 4 and ring.dropped() == 1
+        print("✓ Full ring drops instead of blocking the producer")
+    finally:
+        reader.close()
+        ring.close()
+    
+    # serial.Serial rejects the baud rate with ValueError in the child
+    import serial
+    from process_worker import ProcessSerialComm
+    try:
+        ProcessSerialComm(lambda *event: None, port=None, baudrate=-1, start_timeout=20)
+    except serial.SerialException:
+        print("✓ Worker start-up failure reported instead of hanging")
+    else:
+        raise AssertionError("worker started with an invalid baud rate")
+    return True
+
+def test_event_bus():
+    """Test that a slow subscriber neither blocks the controller nor others."""
+    import threading
+    import time
+    from emulator import FirmwareEmulator
+    from protocol import ProtocolProfile
+    from traffic_controller import TrafficLightController
+    from event_bus import TOPIC_PHASE_CHANGE, TOPIC_ACK, TOPIC_ERROR
+    
+    print("\nTesting event bus...")
+    emulator = FirmwareEmulator(ProtocolProfile(red_seconds=0.05, green_seconds=0.05))
+    release = threading.Event()
+    phases, acks = [], []
+    
+    controller = TrafficLightController(None, port='EMU', serial_factory=emulator.serial_factory,
+                                        profile=emulator.profile)
+    try:
+        slow = controller.subscribe(lambda event: release.wait(), maxsize=2, name='slow')
+        controller.subscribe(lambda event: phases.append(event.light), topics=(TOPIC_PHASE_CHANGE,))
+        controller.subscribe(lambda event: acks.append(event), topics=(TOPIC_ACK,))
+        time.sleep(0.5)
+        
+        assert len(phases) >= 4 and all(a != b for a, b in zip(phases, phases[1:]))
+        assert emulator.acks_received >= 4 and len(acks) >= 4
+        assert slow.dropped > 0
+        print("✓ Phase changes and ACKs delivered while a subscriber is stuck")
+    finally:
+        release.set()
+        controller.close()
+
+    # A CRC-valid frame with an unknown signature is reported but never ACKed
+    from protocol import build_frame
+    emulator = FirmwareEmulator(ProtocolProfile(), clock=lambda: 0.0)
+    written, acks, errors = [], [], []
+    controller = TrafficLightController(None, port='EMU', serial_factory=emulator.serial_factory,
+                                        profile=emulator.profile, clock=lambda: 0.0,
+                                        threaded=False)
+    controller.subscribe(lambda event: acks.append(event), topics=(TOPIC_ACK,))
+    controller.subscribe(lambda event: errors.append(event.light), topics=(TOPIC_ERROR,))
+    port = controller.serial.ser
+    port.write = lambda data: written.append(bytes(data))
+    emulator.tx_buffer.extend(build_frame(b'\x07' * 6))
+    controller.poll()
+    assert written and len(acks) == len(written)
+    assert errors == ['UNKNOWN']
+    controller.close()
+    print("✓ ACK events only for ACKs written to the device")
+    return True
+
+def test_state_server():
+    """Test that dashboards get a snapshot and then live events."""
+    import json
+    import socket
+    from emulator import FirmwareEmulator
+    from protocol import ProtocolProfile
+    from traffic_controller import TrafficLightController
+    from state_server import StateServer
+    
+    print("\nTesting state server...")
+    emulator = FirmwareEmulator(ProtocolProfile(red_seconds=0.05, green_seconds=0.05))
+    controller = TrafficLightController(None, port='EMU', serial_factory=emulator.serial_factory,
+                                        profile=emulator.profile)
+    server = StateServer(controller, port=0).start()
+    try:
+        with socket.create_connection(('127.0.0.1', server.port), timeout=5) as sock:
+            lines = sock.makefile('r')
+            snapshot = json.loads(lines.readline())
+            assert snapshot['type'] == 'snapshot' and 'phase' in snapshot
+            event = json.loads(lines.readline())
+            assert event['type'] == 'event' and event['topic'] == 'phase_change'
+            assert event['light'] in ('RED', 'GREEN') and event['seq'] > snapshot['seq']
+        print("✓ Snapshot followed by phase-change events")
+
+        try:
+            StateServer(controller, port=server.port).start(timeout=2)
+        except OSError:
+            print("✓ Port in use reported instead of hanging")
+        else:
+            raise AssertionError("second server on the same port started")
+    finally:
+        server.stop()
+        controller.close()
+
+    # Attaching after the first frame still shows the current phase
+    import os
+    import tempfile
+    import time
+    from journal import JournalWriter, JournalReader
+    emulator = FirmwareEmulator(ProtocolProfile(red_seconds=10, green_seconds=6))
+    controller = TrafficLightController(None, port='EMU', serial_factory=emulator.serial_factory,
+                                        profile=emulator.profile)
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'late.journal')
+        try:
+            deadline = time.monotonic() + 5
+            while controller.phase is None and time.monotonic() < deadline:
+                time.sleep(0.01)
+            assert controller.phase == 'RED'
+            server = StateServer(controller, port=0).start()
+            writer = JournalWriter(path).attach(controller)
+            with socket.create_connection(('127.0.0.1', server.port), timeout=5) as sock:
+                snapshot = json.loads(sock.makefile('r').readline())
+            assert snapshot['phase'] == 'RED' and snapshot['link'] == 'CONNECTED'
+            assert snapshot['phase_since'] is not None
+            writer.close()
+            reader = JournalReader(path)
+            assert [light for _, light, _ in reader.transitions()] == ['RED']
+            reader.close()
+            print("✓ Late subscribers seeded with the current phase")
+        finally:
+            server.stop()
+            controller.close()
+    return True
+
+def test_journal():
+    """Test time and transition queries against the journal index."""
+    import os
+    import tempfile
+    from journal import JournalWriter, JournalReader
+    
+    print("\nTesting indexed journal...")
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'traffic.journal')
+        writer = JournalWriter(path, sparse_every=8)
+        for i in range(100):
+            if i % 10 == 0:
+                writer.record('IN', 'RED' if i % 20 == 0 else 'GREEN', b'\x01' * 8, 1000.0 + i)
+            elif i == 55:
+                writer.record('OUT', 'GREEN', b'\x01', 1000.0 + i)
+            else:
+                writer.record('OUT', 'ACK', b'\xac', 1000.0 + i)
+        writer.close()
+        
+        reader = JournalReader(path)
+        try:
+            rows = reader.between(1020.0, 1029.0)
+            assert [row[0] for row in rows] == [1000.0 + i for i in range(20, 30)]
+            assert rows[0][1:3] == ('IN', 'RED')
+            first, last = reader.record_range(1020.0, 1029.0)
+            assert first <= 20 and last >= 30 and last - first <= 8 * 3
+            print("✓ Time range read from a slice of the journal")
+            
+            assert [t for t, _, _ in reader.transitions(1000.0, 1035.0)] == [1000.0, 1010.0, 1020.0, 1030.0]
+            assert reader.overrides() == [(1055.0, 'GREEN', 55)]
+            assert reader.read(55)[1:] == ('OUT', 'GREEN', b'\x01')
+            print("✓ Transitions and overrides answered from the index")
+        finally:
+            reader.close()
+        
+        # A crash can leave a torn record, a torn index entry and an entry for a lost record
+        from journal import index_path, INDEX_ENTRY, INDEX_TRANSITION
+        with open(path, 'ab') as f:
+            f.write(b'\x00' * 10)
+        with open(index_path(path), 'ab') as f:
+            f.write(INDEX_ENTRY.pack(INDEX_TRANSITION, 1, 1100.0, 100) + b'\x00' * 5)
+        writer = JournalWriter(path, sparse_every=8)
+        for i in range(10):
+            writer.record('IN', 'RED' if i < 5 else 'GREEN', b'\x01' * 8, 1100.0 + i)
+        writer.close()
+        reader = JournalReader(path)
+        try:
+            assert reader.transitions(1100.0)[-2:] == [(1100.0, 'RED', 100), (1105.0, 'GREEN', 105)]
+            assert [row[0] for row in reader.between(1100.0, 1109.0)] == [1100.0 + i for i in range(10)]
+            print("✓ Torn journal and index tails repaired on reopen")
+        finally:
+            reader.close()
+    return True
+
+def test_phase_store():
+    """Test run-length encoding and per-column downsampling of the timeline."""
+    from timeline import PhaseStore
+    
+    print("\nTesting phase timeline store...")
+    store = PhaseStore()
+    for i in range(10000):
+        store.record_phase('RED' if i % 2 == 0 else 'GREEN', 1000.0 + i * 8)
+        store.record_phase('RED' if i % 2 == 0 else 'GREEN', 1000.5 + i * 8)  # retransmit
+    store.record_override(1004.0)
+    assert len(store) == 10000
+    print("✓ Repeated phases merged into one run")
+    
+    bands, markers = store.columns(1000.0, 1024.0, 6)
+    assert bands == [(1,), (1,), (2,), (2,), (1,), (1,)] and markers == [1]
+    bands, _ = store.columns(1000.0, 1000.0 + 80000, 100)
+    assert len(bands) == 100 and all(band == (1, 2) for band in bands)
+    assert store.columns(0.0, 999.0, 4)[0] == [None] * 4
+    print("✓ Downsampled to the phases present in each column")
+    
+    store = PhaseStore()
+    for at, light in ((0.0, None), (1.0, 'RED'), (2.0, 'GREEN'), (3.0, None)):
+        store.record_phase(light, at)
+    assert store.columns(0.0, 4.0, 1)[0] == [(0, 1, 2)]
+    print("✓ RED kept in columns that also hold link-down and GREEN")
+    return True
+
+def test_virtual_clock():
+    """Test that the virtual clock drives the controller and countdown deterministically."""
+    import time
+    from countdown import PhaseCountdown
+    from event_bus import TOPIC_PHASE_CHANGE
+    from virtual_clock import VirtualClock, SimulatedIntersection
+    
+    print("\nTesting virtual clock harness...")
+    def simulate():
+        sim = SimulatedIntersection()
+        changes = []
+        sim.controller.subscribe(lambda event: changes.append((event.timestamp, event.light)),
+                                 topics=(TOPIC_PHASE_CHANGE,))
+        sim.run(7200)
+        sim.disconnect(0.5)
+        sim.run(60)
+        sim.close()
+        return changes, sim.controller.serial.last_downtime
+    
+    started = time.perf_counter()
+    changes, downtime = simulate()
+    assert time.perf_counter() - started < 5
+    assert changes[:3] == [(0.0, 'RED'), (10.0, 'GREEN'), (16.0, 'RED')]
+    assert len(changes) == 901 + 7  # Both phases every 16 s, plus RED at t=7200
+    assert downtime == 10.0  # Port back after 0.75 s, first frame with GREEN at t=7210
+    assert simulate() == (changes, downtime)
+    print("✓ Two simulated hours plus an adapter reset reproduced exactly")
+    
+    clock = VirtualClock()
+    countdown = PhaseCountdown(clock.monotonic)
+    shown = []
+    def tick():
+        shown.append((clock.monotonic(), countdown.display()))
+        delay = countdown.until_next_change()
+        if delay is not None:
+            clock.after(int(delay * 1000) + 1, tick)
+    countdown.start('RED', 10, at=0.0)
+    tick()
+    clock.advance(12)
+    assert [text for _, text in shown] == [str(n) for n in range(10, 0, -1)] + ['0']
+    assert clock.pending() == 0
+    print("✓ Countdown ticks once per displayed second")
+    return True
+
+def test_export():
+    """Test streaming export of a journal to CSV and .npy columns."""
+    import ast
+    import os
+    import struct
+    import tempfile
+    from journal import JournalWriter
+    from export import export
+    
+    print("\nTesting journal export...")
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'traffic.journal')
+        writer = JournalWriter(path)
+        for i in range(1000):
+            if i % 2 == 0:
+                writer.record('IN', 'RED', b'\x01\x02\x03\x04\x05\x06\xba\xdd', 1000.0 + i * 0.01)
+            else:
+                writer.record('OUT', 'ACK', b'\xac', 1000.0 + i * 0.01)
+        writer.close()
+        
+        csv_path = os.path.join(directory, 'out.csv')
+        progress = []
+        assert export(path, csv_path, chunk_size=300, progress=lambda done, total: progress.append(done)) == 1000
+        assert progress == [300, 600, 900, 1000]
+        with open(csv_path, encoding='utf-8') as f:
+            lines = f.read().splitlines()
+        assert lines[0] == 'timestamp,time,direction,light,data' and len(lines) == 1001
+        assert lines[1].startswith('1000.000000,') and lines[1].endswith(',IN,RED,01 02 03 04 05 06 BA DD')
+        assert lines[2].endswith('.010,OUT,ACK,AC')
+        print("✓ CSV written block by block")
+        
+        npy_path = os.path.join(directory, 'out.npy')
+        assert export(path, npy_path, start=1005.0, end=1005.995) == 100
+        with open(os.path.join(npy_path, 'timestamp.npy'), 'rb') as f:
+            raw = f.read()
+        assert raw[:6] == b'\x93NUMPY'
+        header_length = struct.unpack('<H', raw[8:10])[0]
+        header = ast.literal_eval(raw[10:10 + header_length].decode('latin1'))
+        assert header['descr'] == '<f8' and header['shape'] == (100,)
+        times = struct.unpack('<100d', raw[10 + header_length:])
+        assert times[0] == 1005.0 and abs(times[-1] - 1005.99) < 1e-6
+        print("✓ Time range exported as .npy columns")
+        
+        import threading
+        cancel = threading.Event()
+        cancelled_path = os.path.join(directory, 'cancelled.csv')
+        export(path, cancelled_path, chunk_size=300, cancel=cancel,
+               progress=lambda done, total: cancel.set())
+        try:
+            export(path + '.missing', os.path.join(directory, 'failed.csv'))
+        except OSError:
+            pass
+        assert sorted(name for name in os.listdir(directory) if 'journal' not in name) == \
+            ['out.csv', 'out.npy']
+        print("✓ Cancelled and failed exports leave no output behind")
+    return True
+
+def test_override_gate():
+    """Test coalescing, no-op dropping and rate limiting of override requests."""
+    from event_bus import TOPIC_OVERRIDE
+    from virtual_clock import SimulatedIntersection
+    
+    print("\nTesting override gate...")
+    sim = SimulatedIntersection()
+    sent = []
+    sim.controller.subscribe(lambda event: sent.append((round(event.timestamp, 3), event.light)),
+                             topics=(TOPIC_OVERRIDE,))
+    sim.run(2)  # RED is showing
+    for light in ('GREEN', 'RED', 'GREEN'):  # Triple click
+        sim.manual_override(light)
+        sim.run(0.05)
+    sim.run(0.5)
+    assert sent == [(2.3, 'GREEN')]
+    print("✓ Clicks in one window coalesced, last one sent")
+    
+    sim.manual_override('GREEN')  # Already showing
+    sim.manual_override('RED')    # Within min_interval of the last override
+    sim.run(2)
+    assert sent == [(2.3, 'GREEN'), (3.3, 'RED')]
+    stats = sim.controller.override_gate.stats()
+    assert stats == {'requested': 5, 'sent': 2, 'coalesced': 2, 'noop': 1,
+                     'rate_limited': 1, 'suppressed': 3}
+    sim.close()
+    print("✓ No-op dropped, next override held back by the rate limit")
+    return True
+
+def test_soak():
+    """Test the soak harness and that closing a port joins its reader thread."""
+    from emulator import FirmwareEmulator
+    from serial_comm import SerialComm
+    from soak import run_soak, check
+    
+    print("\nTesting soak harness...")
+    samples = run_soak(hours=1, interval=600, gui=False)
+    assert len(samples) == 6 and samples[-1]['time'] == 3600
+    assert check(samples) == []
+    leaking = [dict(samples[0], threads=samples[0]['threads'] + n) for n in range(3)]
+    assert check(leaking) == ["threads grew from %.1f to %.1f (allowed +0)"
+                              % (samples[0]['threads'], samples[0]['threads'] + 2)]
+    print("✓ Simulated hour sampled without resource growth")
+    
+    samples = run_soak(hours=3 * 1.2 / 3600, interval=1.2, gui=False, threaded=True)
+    assert len(samples) == 3 and check(samples) == []
+    assert samples[0]['threads'] >= 4  # Reader plus the journal and server delivery threads
+    print("✓ Threaded real-time run sampled without thread growth")
+    
+    emulator = FirmwareEmulator()
+    comm = SerialComm(lambda *event: None, port='EMU', serial_factory=emulator.serial_factory)
+    comm.close()
+    assert not comm.thread.is_alive()
+    print("✓ Reader thread joined on close")
+    return True
+
+def test_city_sim():
+    """Test the vectorized multi-board simulator against the firmware timing."""
+    import city_sim
+    
+    print("\nTesting city simulator...")
+    if city_sim.np is None:
+        print("✓ Skipped: numpy not installed")
+        return True
+    
+    sim = city_sim.CitySimulator(200, latency_ms=(1, 1), record=(0,), seed=1)
+    sim.run(3600)
+    stats = sim.stats()
+    # Lossless 2 ms round trip: one frame per phase, 16.002 s per RED/GREEN cycle
+    assert stats['retransmits'] == 0 and stats['ack_p50_ms'] == stats['ack_max_ms'] == 2
+    assert 200 * 449 <= stats['phases'] <= 200 * 451
+    print("✓ Phase timing matches main.c on a clean link")
+    
+    lossy = city_sim.CitySimulator(200, loss=0.2, corruption=0.05, latency_ms=(1, 5),
+                                   overrides_per_hour=30, record=(3,), seed=2)
+    lossy.run(600)
+    stats = lossy.stats()
+    assert stats['retransmits'] > 0 and stats['frames_lost'] > 0 and stats['overrides_applied'] > 0
+    assert stats['acks_sent'] == stats['frames_sent'] - stats['overrides_applied'] \
+        - stats['frames_lost'] - stats['frames_corrupted']
+    check = lossy.spot_check(3)
+    assert sum(check['decoded'].values()) == check['intact'] == check['acks']
+    print("✓ Loss, corruption and overrides injected; SerialComm decodes the replayed stream")
+    return True
+
+def test_reconnect():
+    """Test that SerialComm recovers from an emulated adapter reset."""
+    import threading
+    import time
+    from emulator import FirmwareEmulator
+    from protocol import ProtocolProfile
+    from serial_comm import SerialComm
+    
+    print("\nTesting reconnect supervisor...")
+    emulator = FirmwareEmulator(ProtocolProfile(red_seconds=0.2, green_seconds=0.1))
+    events = []
+    connected = threading.Event()
+    
+    def on_event(direction, light, data):
+        events.append((direction, light))
+        if direction == 'LINK' and light == 'CONNECTED':
+            connected.set()
+    
+    comm = SerialComm(on_event, port='EMU', serial_factory=emulator.serial_factory,
+                      profile=emulator.profile)
+    try:
+        emulator.disconnect(0.2)
+        assert connected.wait(5), "link was not restored"
+        assert comm.reconnects == 1 and comm.last_downtime >= 0.2
+        print("✓ Port reopened after adapter reset")
+        
+        count = len(events)
+        deadline = time.monotonic() + 2
+        while time.monotonic() < deadline and not any(d == 'IN' for d, _ in events[count:]):
+            time.sleep(0.05)
+        assert any(d == 'IN' for d, _ in events[count:]), "no frames after reconnect"
+        print("✓ Frames decoded after reconnect")
+    finally:
+        comm.close()
+
+    # Reopen attempts must not leak handles, even when close() races them
+    opened = []
+
+    def flaky_factory(*args, **kwargs):
+        ser = emulator.serial_factory(*args, **kwargs)
+        if len(opened) == 1:
+            def fail():
+                raise OSError("reset failed")
+            ser.reset_input_buffer = fail
+        opened.append(ser)
+        return ser
+
+    comm = SerialComm(on_event, port='EMU', serial_factory=flaky_factory,
+                      profile=emulator.profile, sleep=lambda s: False, start_thread=False)
+    comm.reconnect('test')
+    assert comm.ser is opened[2] and comm.ser.is_open
+    assert not opened[0].is_open and not opened[1].is_open
+    print("✓ Handle closed when reopening fails half-way")
+
+    def closing_factory(*args, **kwargs):
+        comm.close()  # Shutdown starts while the port is being reopened
+        ser = emulator.serial_factory(*args, **kwargs)
+        opened.append(ser)
+        return ser
+
+    comm.serial_factory = closing_factory
+    comm.running = True
+    comm.reconnect('test')
+    assert not opened[-1].is_open and not comm.connected
+    print("✓ Port reopened during close() is closed again")
+
+    # A port that reopens but stays silent is not a recovered link
+    from virtual_clock import VirtualClock
+    class SilentPort:
+        is_open = True
+        in_waiting = 0
+        def read(self, size=1): return b''
+        def write(self, data): return len(data)
+        def reset_input_buffer(self): pass
+        def close(self): self.is_open = False
+
+    clock = VirtualClock()
+    links = []
+    comm = SerialComm(lambda d, light, data: links.append(light) if d == 'LINK' else None,
+                      port='EMU', serial_factory=lambda *a, **k: SilentPort(),
+                      profile=emulator.profile, clock=clock.monotonic, sleep=clock.sleep,
+                      start_thread=False)
+    while clock.monotonic() < 60:
+        comm.poll()
+        clock.sleep(0.1)
+    assert links == ['DISCONNECTED'] and not comm.connected
+    assert comm.reconnects == 0 and comm.total_downtime == 0.0
+    comm.close()
+    print("✓ Silent device stays disconnected across reopened ports")
+    return True
+
 if __name__ == "__main__":
     print("=== Modular Structure Test ===")
     
     imports_ok = test_imports()
     classes_ok = test_classes()
+    profile_ok = test_protocol_profile()
+    countdown_ok = test_countdown()
+    ring_ok = test_event_ring()
+    bus_ok = test_event_bus()
+    server_ok = test_state_server()
+    journal_ok = test_journal()
+    timeline_ok = test_phase_store()
+    virtual_ok = test_virtual_clock()
+    export_ok = test_export()
+    override_ok = test_override_gate()
+    soak_ok = test_soak()
+    city_ok = test_city_sim()
+    reconnect_ok = test_reconnect()
     
-    if imports_ok and classes_ok:
+    if all([imports_ok, classes_ok, profile_ok, countdown_ok, ring_ok, bus_ok, server_ok,
+            journal_ok, timeline_ok, virtual_ok, export_ok,
+            override_ok, soak_ok, city_ok, reconnect_ok]):
         print("\n🎉 All tests passed! The modular structure is working correctly.")
         print("\nTo run the application, use:")
         print("  python main_modular.py")
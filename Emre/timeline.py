@@ -0,0 +1,217 @@
+"""
+Phase timeline for the traffic light simulator.
+
+PhaseStore keeps the phase history run-length encoded; TimelineView draws it
+as RED/GREEN bands with override markers. Every redraw reduces the visible
+window to the set of phases present in each pixel column, so its cost depends
+on the widget width and not on how many phases are stored.
+"""
+import threading
+import time
+import tkinter as tk
+from bisect import bisect_left, bisect_right
+
+PHASE_CODES = {None: 0, 'RED': 1, 'GREEN': 2}
+PHASE_COLORS = {0: 'gray80', 1: 'red', 2: 'green'}
+
+
+class PhaseStore:
+    """Run-length encoded phase history plus override times."""
+
+    def __init__(self, max_runs=200000):
+        """
+        Initialize an empty history.
+
+        Args:
+            max_runs: Runs kept before the oldest half is discarded
+        """
+        self.max_runs = max_runs
+        self.lock = threading.Lock()
+        self.starts = []  # Start time of each run
+        self.codes = []   # Phase code of each run
+        # prefix[c][i]: runs with code c among the first i runs, for O(1) range queries
+        self.prefix = {code: [0] for code in PHASE_COLORS}
+        self.overrides = []
+
+    def record_phase(self, light, at=None):
+        """
+        Record that a phase is active from now on; repeats are merged.
+
+        Args:
+            light: 'RED', 'GREEN' or None when the state is unknown
+            at: Wall-clock time of the change, now by default
+        """
+        code = PHASE_CODES.get(light, 0)
+        at = time.time() if at is None else at
+        with self.lock:
+            if self.codes and self.codes[-1] == code:
+                return
+            self.starts.append(at)
+            self.codes.append(code)
+            for c, counts in self.prefix.items():
+                counts.append(counts[-1] + (c == code))
+            if len(self.codes) > self.max_runs:
+                self._trim(len(self.codes) // 2)
+
+    def record_override(self, at=None):
+        """
+        Record an override request.
+
+        Args:
+            at: Wall-clock time of the override, now by default
+        """
+        with self.lock:
+            self.overrides.append(time.time() if at is None else at)
+            if len(self.overrides) > self.max_runs:
+                del self.overrides[:len(self.overrides) // 2]
+
+    def _trim(self, count):
+        del self.starts[:count]
+        del self.codes[:count]
+        for code in self.prefix:
+            counts = self.prefix[code][count:]
+            base = counts[0]
+            self.prefix[code] = [n - base for n in counts]
+
+    def __len__(self):
+        return len(self.codes)
+
+    def columns(self, start, end, width):
+        """
+        Downsample [start, end) to the phase codes present in each pixel column.
+
+        Args:
+            start: Wall-clock time at the left edge
+            end: Wall-clock time at the right edge
+            width: Number of pixel columns
+
+        Returns:
+            tuple: (bands, markers) where bands is a list of None or a sorted
+            tuple of the codes present per column and markers lists the
+            columns holding an override
+        """
+        step = (end - start) / width
+        bands, markers = [], []
+        with self.lock:
+            starts, prefix, overrides = self.starts, self.prefix, self.overrides
+            for column in range(width):
+                left = start + column * step
+                right = left + step
+                if bisect_left(overrides, right) > bisect_left(overrides, left):
+                    markers.append(column)
+                # Run active at the left edge and last run starting before the right edge
+                first = max(bisect_right(starts, left) - 1, 0)
+                last = bisect_left(starts, right) - 1
+                if last < 0:
+                    bands.append(None)
+                    continue
+                # Phases are categories, so every one present is kept; a
+                # short RED run must not vanish between link-down and GREEN
+                bands.append(tuple(code for code in PHASE_COLORS
+                                   if prefix[code][last + 1] > prefix[code][first]))
+        return bands, markers
+
+
+class TimelineView:
+    """Scrolling canvas of phase bands; wheel to zoom, drag to pan."""
+
+    def __init__(self, parent, store, width=600, height=36, span=600.0, clock=time.time):
+        """
+        Create the timeline canvas.
+
+        Args:
+            parent: Parent Tk widget
+            store: PhaseStore to draw
+            width: Canvas width in pixels
+            height: Canvas height in pixels
+            span: Initially visible time window in seconds
+            clock: Function returning the current wall-clock time
+        """
+        self.store = store
+        self.width = width
+        self.height = height
+        self.span = span
+        self.clock = clock
+        self.end = None  # None follows the live edge
+        self._drag_x = None
+
+        self.canvas = tk.Canvas(parent, width=width, height=height + 14, bg='white',
+                                highlightthickness=1, relief='ridge')
+        self.canvas.bind('<MouseWheel>', self._on_wheel)
+        self.canvas.bind('<Button-4>', lambda e: self.zoom(0.8))
+        self.canvas.bind('<Button-5>', lambda e: self.zoom(1.25))
+        self.canvas.bind('<ButtonPress-1>', self._on_press)
+        self.canvas.bind('<B1-Motion>', self._on_drag)
+        self.canvas.bind('<Double-Button-1>', lambda e: self.follow())
+
+    def pack(self, **kwargs):
+        self.canvas.pack(**kwargs)
+
+    def window(self):
+        """Return the visible (start, end) wall-clock times."""
+        end = self.clock() if self.end is None else self.end
+        return end - self.span, end
+
+    def zoom(self, factor):
+        """
+        Scale the visible window around its right edge.
+
+        Args:
+            factor: Below 1 zooms in, above 1 zooms out
+        """
+        self.span = min(max(self.span * factor, 10.0), 7 * 24 * 3600.0)
+        self.redraw()
+
+    def follow(self):
+        """Return to following the live edge."""
+        self.end = None
+        self.redraw()
+
+    def _on_wheel(self, event):
+        self.zoom(0.8 if event.delta > 0 else 1.25)
+
+    def _on_press(self, event):
+        self._drag_x = event.x
+
+    def _on_drag(self, event):
+        if self._drag_x is None:
+            return
+        seconds = (self._drag_x - event.x) * self.span / self.width
+        self._drag_x = event.x
+        _, end = self.window()
+        self.end = min(end + seconds, self.clock())
+        if self.end >= self.clock():
+            self.end = None
+        self.redraw()
+
+    def redraw(self):
+        """Draw the visible window; at most one rectangle per run of equal columns."""
+        start, end = self.window()
+        bands, markers = self.store.columns(start, end, self.width)
+        canvas = self.canvas
+        canvas.delete('all')
+
+        column = 0
+        while column < self.width:
+            band = bands[column]
+            run_end = column + 1
+            while run_end < self.width and bands[run_end] == band:
+                run_end += 1
+            if band is not None:
+                # Several phases fall into these columns: one stripe each
+                for i, code in enumerate(band):
+                    top = self.height * i // len(band)
+                    bottom = self.height * (i + 1) // len(band)
+                    canvas.create_rectangle(column, top, run_end, bottom,
+                                            fill=PHASE_COLORS[code], width=0)
+            column = run_end
+
+        for column in markers:
+            canvas.create_line(column, 0, column, self.height, fill='blue', width=2)
+
+        label_format = '%H:%M:%S' if self.span < 6 * 3600 else '%d %H:%M'
+        for fraction in (0.0, 0.5, 1.0):
+            x = min(int(fraction * self.width), self.width - 1)
+            anchor = {0.0: 'nw', 0.5: 'n', 1.0: 'ne'}[fraction]
+            label = time.strftime(label_format, time.localtime(start + fraction * self.span))
+            canvas.create_text(x, self.height + 1, text=label, anchor=anchor, font=("Arial", 8))
@@ -1,48 +1,173 @@
 """
 Traffic light controller module.
 """
+import threading
+import time
+import serial
 from serial_comm import SerialComm
+from process_worker import ProcessSerialComm
+from protocol import DEFAULT_PROFILE
+from override_gate import OverrideGate
+from event_bus import (EventBus, Event, TOPIC_RAW_FRAME, TOPIC_PHASE_CHANGE, TOPIC_ACK,
+                       TOPIC_OVERRIDE, TOPIC_LINK, TOPIC_ERROR)
 
 
 class TrafficLightController:
     """Controls the traffic light system and handles communication."""
     
-    def __init__(self, gui_callback, port=None, baudrate=115200):
+    def __init__(self, gui_callback, port=None, baudrate=None, profile=DEFAULT_PROFILE,
+                 isolated=False, serial_factory=serial.Serial, clock=time.monotonic,
+                 sleep=None, threaded=True, override_window=0.3, override_interval=1.0):
         """
         Initialize the traffic light controller.
         
         Args:
-            gui_callback: Function to call when events occur
+            gui_callback: Function to call when events occur, or None
             port: COM port for serial communication
             baudrate: Baud rate for serial communication
+            profile: ProtocolProfile shared with the serial layer
+            isolated: Run the serial I/O in a separate process
+            serial_factory: Callable opening the port, serial.Serial by default
+            clock: Function returning the current time in seconds
+            sleep: Function waiting between reconnect attempts, see SerialComm
+            threaded: Use reader and delivery threads; if False nothing runs
+                until poll() is called and subscribers are called inline
+            override_window: Seconds override requests are coalesced before sending
+            override_interval: Minimum seconds between overrides sent to the device
         """
         self.gui_callback = gui_callback
-        self.serial = SerialComm(self.handle_packet, port=port, baudrate=baudrate)
+        self.profile = profile
         self.current_state = 'RED'  # RED, GREEN
+        self.phase = None  # Last phase reported by the device
+        self.phase_frame = None  # Raw frame event that started that phase
+        self.clock = clock
+        self.threaded = threaded
+        self.override_gate = OverrideGate(override_window, override_interval, clock)
+        self._override_lock = threading.Lock()
+        self._override_timer = None
+        
+        # Subscribers must exist before the first frame can arrive
+        self.bus = EventBus(synchronous=not threaded, clock=clock)
+        if gui_callback:
+            self.subscribe(
+                lambda event: gui_callback(event.direction, event.light, event.data),
+                topics=(TOPIC_RAW_FRAME,), name='gui'
+            )
+        
+        if isolated:
+            self.serial = ProcessSerialComm(self.handle_packet, port=port, baudrate=baudrate,
+                                            serial_factory=serial_factory, profile=profile)
+        else:
+            self.serial = SerialComm(self.handle_packet, port=port, baudrate=baudrate,
+                                     serial_factory=serial_factory, profile=profile,
+                                     clock=clock, sleep=sleep, start_thread=threaded)
+
+    def poll(self):
+        """Process whatever the port has buffered; only needed when not threaded."""
+        self.serial.poll()
+        deadline = self.override_gate.deadline
+        if deadline is not None and self.clock() >= deadline:
+            self._flush_override()
+
+    def subscribe(self, handler, topics=None, maxsize=1000, name=None):
+        """
+        Subscribe to controller events.
+        
+        Args:
+            handler: Function called with each event_bus.Event on its own thread
+            topics: Topics to receive (see event_bus.TOPICS), all if None
+            maxsize: Events buffered for this subscriber before the oldest is dropped
+            name: Name of the delivery thread
+            
+        Returns:
+            Subscription: Handle to pass to unsubscribe()
+        """
+        return self.bus.subscribe(handler, topics, maxsize, name)
+
+    def unsubscribe(self, subscription):
+        """
+        Remove a subscriber.
+        
+        Args:
+            subscription: Handle returned by subscribe()
+        """
+        self.bus.unsubscribe(subscription)
 
     def handle_packet(self, direction, light, data):
         """
         Handle incoming/outgoing packets from serial communication.
         
+        Runs on the serial reader thread, so it only classifies the packet and
+        queues it for subscribers. phase and phase_frame are updated before
+        anything is published, so a subscriber that attaches late either
+        receives an event or finds its effect already in place.
+        
         Args:
-            direction: 'IN' or 'OUT'
+            direction: 'IN', 'OUT' or 'LINK'
             light: Light state ('RED', 'GREEN', etc.)
             data: Raw packet data
         """
+        publish = self.bus.publish
+        timestamp = self.clock()
+        changed = False
         if direction == 'IN':
             self.current_state = light
-        self.gui_callback(direction, light, data)
+            if light in self.profile.phase_seconds and light != self.phase:
+                self.phase = light
+                self.phase_frame = Event(TOPIC_RAW_FRAME, direction, light, data, timestamp)
+                changed = True
+        elif direction == 'LINK' and light == 'DISCONNECTED':
+            self.phase = None
+            self.phase_frame = None
+        publish(TOPIC_RAW_FRAME, direction, light, data, timestamp)
+        
+        if direction == 'IN':
+            if changed:
+                publish(TOPIC_PHASE_CHANGE, direction, light, data, timestamp)
+            elif light not in self.profile.phase_seconds:
+                publish(TOPIC_ERROR, direction, light, data, timestamp)
+        elif direction == 'OUT':
+            if light == 'ACK':
+                publish(TOPIC_ACK, direction, light, data, timestamp)
+            elif light in self.profile.override_by_light:
+                publish(TOPIC_OVERRIDE, direction, light, data, timestamp)
+        elif direction == 'LINK':
+            if light == 'DISCONNECTED':
+                publish(TOPIC_ERROR, direction, light, data, timestamp)
+            publish(TOPIC_LINK, direction, light, data, timestamp)
 
     def manual_override(self, light):
         """
-        Send manual override command.
+        Request a manual override.
+        
+        Requests are coalesced for override_window seconds and the last one
+        is sent, unless the device already shows that phase; see OverrideGate.
         
         Args:
             light: 'RED' or 'GREEN' to override to
         """
-        self.serial.send_override(light)
+        with self._override_lock:
+            deadline = self.override_gate.request(light, self.phase)
+            if deadline is None or not self.threaded or self._override_timer:
+                return
+            self._override_timer = threading.Timer(max(deadline - self.clock(), 0),
+                                                   self._flush_override)
+            self._override_timer.daemon = True
+            self._override_timer.start()
+
+    def _flush_override(self):
+        with self._override_lock:
+            self._override_timer = None
+            light = self.override_gate.pop(self.phase)
+        if light:
+            self.serial.send_override(light)
 
     def close(self):
         """Close the controller and serial connection."""
+        with self._override_lock:
+            if self._override_timer:
+                self._override_timer.cancel()
+                self._override_timer = None
         if hasattr(self, 'serial'):
             self.serial.close()
+        self.bus.close()
@@ -0,0 +1,183 @@
+"""
+Deterministic virtual clock for the traffic light simulator.
+
+VirtualClock stands in for both time.monotonic() and Tk's after()/after_cancel(),
+so the countdown, reconnect backoff and GUI redraw chains can be driven
+without real waiting. SimulatedIntersection wires the firmware emulator and an
+unthreaded controller to one clock: hours of phase cycles run in well under a
+second and produce the same event sequence every time.
+"""
+import heapq
+import itertools
+from emulator import FirmwareEmulator
+from protocol import DEFAULT_PROFILE
+from traffic_controller import TrafficLightController
+
+
+class VirtualClock:
+    """Manually advanced clock with a Tk-compatible callback scheduler."""
+
+    def __init__(self, start=0.0, epoch=1700000000.0):
+        """
+        Initialize a stopped clock.
+
+        Args:
+            start: Initial monotonic time in seconds
+            epoch: Wall-clock time corresponding to monotonic time 0
+        """
+        self.now = start
+        self.epoch = epoch
+        self._queue = []  # (due, id, func, args), ordered by time then scheduling order
+        self._ids = itertools.count(1)
+        self._live = set()  # Scheduled and neither run nor cancelled
+
+    def monotonic(self):
+        """Return the current time in seconds; use in place of time.monotonic."""
+        return self.now
+
+    def time(self):
+        """Return the current wall-clock time; use in place of time.time."""
+        return self.epoch + self.now
+
+    def call_at(self, when, func, *args):
+        """
+        Schedule a callback at an absolute time.
+
+        Args:
+            when: Monotonic time in seconds
+            func: Function to call
+            *args: Arguments for func
+
+        Returns:
+            int: Id for after_cancel()
+        """
+        callback_id = next(self._ids)
+        heapq.heappush(self._queue, (when, callback_id, func, args))
+        self._live.add(callback_id)
+        return callback_id
+
+    def after(self, ms, func, *args):
+        """Schedule a callback ms milliseconds from now, like Tk's after()."""
+        return self.call_at(self.now + ms / 1000, func, *args)
+
+    def after_cancel(self, callback_id):
+        """Cancel a callback returned by after() or call_at(); unknown ids are ignored."""
+        self._live.discard(callback_id)
+
+    def sleep(self, seconds):
+        """
+        Move time forward without running callbacks, like a blocking sleep.
+
+        Returns:
+            bool: False, matching threading.Event.wait() timing out
+        """
+        self.now += max(seconds, 0)
+        return False
+
+    def advance(self, seconds):
+        """
+        Move time forward, running every callback that falls due in order.
+
+        Callbacks see the clock at their due time, or later if an earlier
+        callback slept past it.
+
+        Args:
+            seconds: Time to advance by
+
+        Returns:
+            int: Number of callbacks run
+        """
+        end = self.now + seconds
+        ran = 0
+        while self._queue and self._queue[0][0] <= end:
+            when, callback_id, func, args = heapq.heappop(self._queue)
+            if callback_id not in self._live:
+                continue
+            self._live.discard(callback_id)
+            self.now = max(self.now, when)
+            func(*args)
+            ran += 1
+        self.now = max(self.now, end)
+        return ran
+
+    def pending(self):
+        """Return the number of scheduled, not cancelled callbacks."""
+        return len(self._live)
+
+
+class SimulatedIntersection:
+    """Firmware emulator and controller sharing one virtual clock."""
+
+    def __init__(self, profile=DEFAULT_PROFILE, clock=None, callback=None):
+        """
+        Open a controller on an emulated board; nothing runs until run().
+
+        Args:
+            profile: ProtocolProfile of the emulated firmware
+            clock: VirtualClock to use, a new one by default
+            callback: Optional (direction, light, data) callback, e.g. a GUI's log_event
+        """
+        self.clock = clock or VirtualClock()
+        self.emulator = FirmwareEmulator(profile, clock=self.clock.monotonic)
+        self.controller = TrafficLightController(
+            callback, port='EMU', profile=profile,
+            serial_factory=self.emulator.serial_factory,
+            clock=self.clock.monotonic, sleep=self.clock.sleep, threaded=False
+        )
+        self.polls = 0
+        self._pump_id = self.clock.call_at(self.clock.now, self._pump)
+
+    def _pump(self):
+        # Service the port, then sleep until the board next has something to say
+        self._pump_id = None
+        self.controller.poll()
+        self.polls += 1
+        wake = self.emulator.next_event()
+        if self.controller.override_gate.deadline is not None:
+            wake = min(wake, self.controller.override_gate.deadline)
+        self._schedule(max(wake, self.clock.now + 0.001))
+
+    def _schedule(self, when):
+        if self._pump_id is not None:
+            self.clock.after_cancel(self._pump_id)
+        self._pump_id = self.clock.call_at(when, self._pump)
+
+    def disconnect(self, duration):
+        """
+        Reset the emulated adapter now; the controller notices on its next read.
+
+        Args:
+            duration: Seconds until the port can be reopened
+        """
+        self.emulator.disconnect(duration)
+        self.wake()
+
+    def wake(self):
+        """Poll now, e.g. after calling the controller or its GUI directly."""
+        self._schedule(self.clock.now)
+
+    def manual_override(self, light):
+        """
+        Press an override button; it is sent once the controller's window closes.
+
+        Args:
+            light: 'RED' or 'GREEN'
+        """
+        self.controller.manual_override(light)
+        self.wake()
+
+    def run(self, seconds):
+        """
+        Simulate the given number of seconds.
+
+        Args:
+            seconds: Simulated time to run for
+
+        Returns:
+            int: Number of scheduled callbacks run
+        """
+        return self.clock.advance(seconds)
+
+    def close(self):
+        """Close the controller."""
+        self.controller.close()